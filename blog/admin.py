@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse
 from django.conf.urls import url, include
 from django import forms
+from django.utils.html import format_html
 from django.contrib.contenttypes.forms import BaseGenericInlineFormSet, generic_inlineformset_factory
 from django.contrib.contenttypes.admin import GenericTabularInline, GenericStackedInline
 from django.core.exceptions import *
@@ -9,6 +11,7 @@ from django.core.exceptions import *
 from reversion.admin import VersionAdmin
 
 from models import *
+from featured import invalidate_featured_images
 
 
 def create_modeladmin(modeladmin, model, name = None):
@@ -34,10 +37,12 @@ def help_text(s):
 
 def make_image_feature(modeladmin, request, queryset):
     queryset.update(feature=True)
+    invalidate_featured_images()
 
 
 def make_image_not_feature(modeladmin, request, queryset):
-    queryset.update(feature=True)
+    queryset.update(feature=False)
+    invalidate_featured_images()
 
 
 
@@ -304,14 +309,16 @@ class PropertyAdminForm(forms.ModelForm):
         """
         super(PropertyAdminForm, self).clean()
         data = self.cleaned_data
-        if not data['source'].is_a(data['instance_of'].domain):
+        if not rdf_property_index.in_domain(data['instance_of'].id,
+                                            data['source'].instance_of_id):
             raise ValidationError(help_text("""
                 Cannot apply this type of property to the selected entities:
                 source entity is not in the domain of the selected property
                 type. Choose a %s as source, or select a different property
                 type.""" % data['instance_of'].domain.__unicode__()))
 
-        if not data['target'].is_a(data['instance_of'].range):
+        if not rdf_property_index.in_range(data['instance_of'].id,
+                                           data['target'].instance_of_id):
             raise ValidationError(help_text("""
                 Cannot apply this type of property to the selected entities:
                 target entity is not in the range of the selected property
@@ -476,8 +483,28 @@ class EntityCreateRelationForm(forms.Form):
     relation_type = forms.ModelChoiceField(queryset=RDFProperty.objects.all())
     evidence = forms.ModelChoiceField(queryset=ExternalResource.objects.all())
 
+class EntityLookupWidget(forms.HiddenInput):
+    """
+    Stores the selected :class:`.Entity` id in a hidden input, and renders a
+    search box that queries ``lookup_url`` as the user types. Unlike a
+    select widget, this never iterates over the choice queryset.
+    """
+    def __init__(self, lookup_url=None, *args, **kwargs):
+        self.lookup_url = lookup_url
+        super(EntityLookupWidget, self).__init__(*args, **kwargs)
+
+    def render(self, name, value, attrs=None):
+        hidden = super(EntityLookupWidget, self).render(name, value, attrs)
+        return format_html(
+            '{0}<input type="text" class="vTextField entity-lookup"'
+            ' data-target="{1}" data-source="{2}" />',
+            hidden, attrs.get('id', name) if attrs else name,
+            self.lookup_url or '')
+
+
 class EntityCreateRelationSelectTargetForm(forms.Form):
-    target = forms.ModelChoiceField(queryset=Entity.objects.all())
+    target = forms.ModelChoiceField(queryset=Entity.objects.all(),
+                                    widget=EntityLookupWidget)
 
 
 class EntityAdmin(SetCreatorMixin, admin.ModelAdmin):
@@ -489,6 +516,8 @@ class EntityAdmin(SetCreatorMixin, admin.ModelAdmin):
     exclude = []
     list_display = ['label', 'instance_of', 'concept']
 
+    lookup_page_size = 20
+
     def create_relation(self, request, entity_id):
         """
         Prompt user to select a property type. Once selected, direct user to
@@ -524,13 +553,52 @@ class EntityAdmin(SetCreatorMixin, admin.ModelAdmin):
 
         form = EntityCreateRelationSelectTargetForm()
         form.fields['target'].queryset = property_class.range.children_instances
+        form.fields['target'].widget.lookup_url = reverse('admin:entity_target_lookup', args=(property_id,))
         return render(request, 'entityform.html', {'form': form})
 
+    def target_lookup(self, request, property_id):
+        """
+        JSON list of candidate targets (instances of the range of the
+        :class:`.RDFProperty`\, or its descendants), filtered by the ``q``
+        parameter and paginated with ``page``. A property without a range has
+        no candidates.
+        """
+        property_class = get_object_or_404(RDFProperty, pk=property_id)
+        query = request.GET.get('q', '').strip()
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        if property_class.range is None:
+            return JsonResponse({'page': page, 'has_next': False, 'results': []})
+
+        queryset = property_class.range.children_instances\
+                                 .select_related('instance_of')\
+                                 .order_by('label', 'id')
+        if query:
+            queryset = queryset.filter(label__icontains=query)
+
+        # Fetch one extra row to find out whether there is a next page, rather
+        #  than COUNTing the whole (potentially huge) candidate set.
+        offset = (page - 1) * self.lookup_page_size
+        results = list(queryset[offset:offset + self.lookup_page_size + 1])
+        return JsonResponse({
+            'page': page,
+            'has_next': len(results) > self.lookup_page_size,
+            'results': [{
+                'id': entity.id,
+                'label': entity.label,
+                'instance_of': unicode(entity.instance_of),
+            } for entity in results[:self.lookup_page_size]],
+        })
+
 
     def get_urls(self):
         urls = super(EntityAdmin, self).get_urls()
         extra_urls = [
             url(r'^create/relation/(?P<entity_id>[0-9]+)/$', self.admin_site.admin_view(self.create_relation), name="entity_create_relation"),
+            url(r'^lookup/target/(?P<property_id>[0-9]+)/$', self.admin_site.admin_view(self.target_lookup), name="entity_target_lookup"),
         ]
         return extra_urls + urls
 
@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils.html import format_html
+
+from concepts.authorities import get_namespace, get_by_namespace
+from concepts.models import Concept
+from blog.models import ConceptProfile, Entity, RDFClass
+from blog.lru import LRUCache
+
+import datetime
+
+LINK_CACHE_SIZE = getattr(settings, 'CONCEPT_LINK_CACHE_SIZE', 10000)
+
+# Keeps the number of query parameters well below SQLite's limit.
+BATCH_SIZE = 500
+
+# Maps URIs to rendered links to their ConceptProfiles.
+link_cache = LRUCache(LINK_CACHE_SIZE)
+
+validate_url = URLValidator()
+
+
+def is_authority_uri(value):
+    """
+    Whether ``value`` is a URI in the namespace of one of the registered
+    :class:`concepts.authorities.AuthorityManager`\s.
+    """
+    # Most cells aren't URLs at all; don't bother running the validator.
+    if not value.startswith(('http://', 'https://')):
+        return False
+    try:
+        validate_url(value)
+        return len(get_by_namespace(get_namespace(value))) > 0
+    except (ValidationError, ValueError):
+        return False
+
+
+def _batches(values):
+    values = list(values)
+    for start in xrange(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def resolve_links(values):
+    """
+    Find links to :class:`.ConceptProfile`\s for the authority URIs among
+    ``values``\.
+
+    Each distinct URI is looked up at most once; URIs that aren't in
+    :data:`.link_cache` are looked up together. Nothing is created: URIs
+    that have no profile yet are left out, and can be created with the
+    ``create_data_concepts`` command.
+
+    Returns
+    -------
+    dict
+        Maps URIs to (safe) HTML links.
+    """
+    links, missing = {}, []
+    for uri in set(value for value in values if is_authority_uri(value)):
+        link = link_cache.get(uri)
+        if link is None:
+            missing.append(uri)
+        else:
+            links[uri] = link
+
+    for batch in _batches(missing):
+        profiles = ConceptProfile.objects.filter(concept__uri__in=batch)\
+                                         .values_list('concept__uri', 'id', 'concept__label')
+        for uri, profile_id, label in profiles:
+            link = format_html('<a class="label label-success" href="{}">{}</a>',
+                               reverse('conceptprofile', args=(profile_id,)),
+                               label or uri)
+            link_cache.set(uri, link)
+            links[uri] = link
+    return links
+
+
+def link_rows(rows):
+    """
+    Replace authority URIs in ``rows`` (lists of cells) with links to their
+    :class:`.ConceptProfile`\s. See :func:`.resolve_links`\.
+    """
+    rows = list(rows)
+    links = resolve_links(cell for row in rows for cell in row)
+    return [[links.get(cell, cell) for cell in row] for row in rows]
+
+
+def create_concepts(uris, creator_id=1):
+    """
+    Create a :class:`.Concept` (with its :class:`.Entity` and
+    :class:`.ConceptProfile`\) for each of ``uris`` that doesn't already have
+    one.
+
+    Instances are bulk-created, so no signals are sent and the new concepts
+    are not resolved against their authorities.
+
+    Returns
+    -------
+    list
+        The new :class:`.Concept`\s.
+    """
+    uris = set(uris)
+    with transaction.atomic():
+        for batch in _batches(uris):
+            uris -= set(Concept.objects.filter(uri__in=batch)
+                                       .values_list('uri', flat=True))
+
+        real_type = ContentType.objects.get_for_model(Concept)
+        Concept.objects.bulk_create([
+            Concept(uri=uri, real_type=real_type,
+                    authority=get_by_namespace(get_namespace(uri))[0].__name__)
+            for uri in uris
+        ], batch_size=BATCH_SIZE)
+
+        # Not all backends set primary keys in bulk_create.
+        concepts = [concept for batch in _batches(uris)
+                    for concept in Concept.objects.filter(uri__in=batch)]
+
+        instance_of = RDFClass.objects.get(identifier='E1_CRM_Entity')
+        Entity.objects.bulk_create([
+            Entity(concept=concept, instance_of=instance_of)
+            for concept in concepts
+        ], batch_size=BATCH_SIZE)
+
+        now = datetime.datetime.now()
+        ConceptProfile.objects.bulk_create([
+            ConceptProfile(concept=concept, creator_id=creator_id, created=now,
+                           summary='Pending', description='Pending')
+            for concept in concepts
+        ], batch_size=BATCH_SIZE)
+    return concepts
@@ -0,0 +1,301 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from array import array
+import csv
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib2
+
+import logging
+logger = logging.getLogger(__name__)
+
+ROWS_PER_PAGE = 100
+
+# Upper limit on the number of rows that can be requested at once.
+MAX_ROWS = 1000
+
+# Number of rows between checkpoints in the offset index.
+INDEX_INTERVAL = 100
+
+CHUNK_SIZE = 64 * 1024
+
+# Byte offsets in stored indexes are signed longs.
+OFFSET_TYPECODE = 'l'
+
+DOWNLOAD_TIMEOUT = 30
+
+
+def get_cache_dir():
+    return getattr(settings, 'DATA_CACHE_DIR',
+                   os.path.join(tempfile.gettempdir(), 'genecology-data'))
+
+
+def get_local_path(location):
+    """
+    Where the local copy of the file at ``location`` is kept.
+    """
+    name = hashlib.sha1(location.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), name + '.csv')
+
+
+def _write_atomically(path, write):
+    """
+    Call ``write`` with a file object, and then move what was written to
+    ``path``\. Readers never see a partially-written file.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    handle, temporary_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            write(f)
+        os.rename(temporary_path, path)
+    except:
+        os.remove(temporary_path)
+        raise
+
+
+def read_metadata(path):
+    """
+    Validators (``etag``\, ``last_modified``\) and the time of the last
+    successful validation (``validated``\) for the local copy at ``path``\.
+    """
+    try:
+        with open(path + '.json', 'rb') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_metadata(path, metadata):
+    _write_atomically(path + '.json', lambda f: json.dump(metadata, f))
+
+
+def download(location, path, metadata=None):
+    """
+    Copy the remote file at ``location`` to ``path``\, one chunk at a time.
+
+    If ``metadata`` (see :func:`.read_metadata`\) is provided, the request is
+    conditional on the remote file having changed.
+
+    Returns
+    -------
+    dict
+        Validators for the new copy, or ``None`` if the remote file has not
+        changed (in which case ``path`` is left alone).
+    """
+    request = urllib2.Request(location)
+    if metadata and metadata.get('etag'):
+        request.add_header('If-None-Match', metadata['etag'])
+    if metadata and metadata.get('last_modified'):
+        request.add_header('If-Modified-Since', metadata['last_modified'])
+
+    try:
+        response = urllib2.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+    except urllib2.HTTPError as error:
+        if error.code == 304:    # Not modified.
+            return None
+        raise
+
+    try:
+        _write_atomically(path, lambda f: shutil.copyfileobj(response, f, CHUNK_SIZE))
+        headers = response.info()
+        return {
+            'location': location,
+            'etag': headers.getheader('ETag'),
+            'last_modified': headers.getheader('Last-Modified'),
+        }
+    finally:
+        response.close()
+
+
+def fetch(location):
+    """
+    Path to a local copy of the file at ``location``\.
+
+    The copy is used without any network access for
+    ``settings.DATA_CACHE_TIMEOUT`` seconds after it was last validated. After
+    that it is revalidated with a conditional request, so an unchanged file is
+    not downloaded again. If the remote file can't be reached, the stale copy
+    is used.
+    """
+    path = get_local_path(location)
+    metadata = read_metadata(path) if os.path.exists(path) else {}
+    timeout = getattr(settings, 'DATA_CACHE_TIMEOUT', 600)
+    if metadata and time.time() - metadata.get('validated', 0) < timeout:
+        return path
+
+    try:
+        updated = download(location, path, metadata)
+    except IOError as error:    # Includes URLError, HTTPError, timeouts.
+        if not metadata:
+            raise
+        # Don't retry on every request while the remote is down.
+        logger.warning('Could not revalidate %s; using stale copy: %s', location, error)
+        updated = None
+
+    if updated is not None:
+        metadata = updated
+        if getattr(settings, 'DATA_CACHE_PRECONVERT', True):
+            write_index(path, build_index(path))
+    metadata['validated'] = time.time()
+    write_metadata(path, metadata)
+    return path
+
+
+def decode_row(row):
+    return [cell.decode('utf-8', 'replace') for cell in row]
+
+
+class PositionedLines(object):
+    """
+    Iterates over the lines in ``f``\, keeping track of the byte offset just
+    past the last line consumed.
+
+    ``csv.reader`` pulls lines one at a time until it has a complete record
+    (which may span several lines), so between records :attr:`.position` is
+    the offset at which the next record starts.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.position = f.tell()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.position += len(line)
+        return line
+
+    __next__ = next
+
+
+def build_index(path):
+    """
+    Scan the CSV file at ``path``\.
+
+    Returns
+    -------
+    dict
+        ``header`` (list of column names), ``count`` (number of rows, not
+        including the header), and ``offsets`` (byte offset of every
+        :data:`.INDEX_INTERVAL`\th row).
+    """
+    with open(path, 'rb') as f:
+        lines = PositionedLines(f)
+        reader = csv.reader(lines)
+        header = next(reader, [])
+
+        offsets, count, position = [], 0, lines.position
+        for row in reader:
+            if count % INDEX_INTERVAL == 0:
+                offsets.append(position)
+            count += 1
+            position = lines.position
+
+    return {'header': decode_row(header), 'count': count, 'offsets': offsets}
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def write_index(path, index):
+    """
+    Store ``index`` (see :func:`.build_index`\) alongside the CSV file at
+    ``path``\. Offsets are stored as a packed binary array, so even an index
+    for millions of rows loads in a single read.
+    """
+    offsets = array(OFFSET_TYPECODE, index['offsets'])
+    _write_atomically(path + '.idx', offsets.tofile)
+    write_metadata(path + '.idx', {
+        'header': index['header'],
+        'count': index['count'],
+        'signature': _file_signature(path),
+    })
+
+
+def read_index(path):
+    """
+    The index stored by :func:`.write_index`\, or ``None`` if there is none
+    or it is out of date.
+    """
+    metadata = read_metadata(path + '.idx')
+    if metadata.get('signature') != _file_signature(path):
+        return None
+    offsets = array(OFFSET_TYPECODE)
+    length = (metadata['count'] + INDEX_INTERVAL - 1) // INDEX_INTERVAL
+    try:
+        with open(path + '.idx', 'rb') as f:
+            offsets.fromfile(f, length)
+    except (IOError, EOFError):
+        return None
+    return {'header': metadata['header'], 'count': metadata['count'],
+            'offsets': offsets.tolist()}
+
+
+def get_index(path):
+    """
+    The index (see :func:`.build_index`\) for the CSV file at ``path``\.
+    Indexes are cached for as long as the file is unchanged.
+    """
+    key = 'blog.datasets.index.%s' % hashlib.sha1(
+        '%s|%i|%f' % tuple([path] + _file_signature(path))).hexdigest()
+    index = cache.get(key)
+    if index is None:
+        index = read_index(path)
+        if index is None:
+            index = build_index(path)
+        cache.set(key, index, None)
+    return index
+
+
+class Dataset(object):
+    """
+    A CSV file for a :class:`.Data` instance, with random access to its rows.
+
+    The remote file is copied to disk in chunks (see :func:`.fetch`\), and
+    scanned once to build an index of the byte offset of every
+    :data:`.INDEX_INTERVAL`\th row. Reading a page of rows then means seeking
+    to the nearest checkpoint, rather than parsing (or holding in memory)
+    every row that comes before it.
+    """
+    def __init__(self, data_object):
+        self.data_object = data_object
+        self.path = fetch(data_object.location)
+        self.index = get_index(self.path)
+
+    @property
+    def header(self):
+        return self.index['header']
+
+    @property
+    def count(self):
+        return self.index['count']
+
+    def rows(self, offset=0, limit=ROWS_PER_PAGE):
+        """
+        Generate (up to) ``limit`` rows, starting with row ``offset`` (not
+        counting the header). Each row is a list of unicode cells.
+        """
+        if offset < 0 or limit <= 0 or offset >= self.count:
+            return
+
+        checkpoint = offset // INDEX_INTERVAL
+        skip = offset - checkpoint * INDEX_INTERVAL
+        with open(self.path, 'rb') as f:
+            f.seek(self.index['offsets'][checkpoint])
+            for row in itertools.islice(csv.reader(f), skip, skip + limit):
+                yield decode_row(row)
@@ -1,14 +1,20 @@
 from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.core.cache import cache
 from django.conf import settings
+from django.db import transaction
 
 from blog.models import *
+from blog.evernote_pool import pool
 
-from evernote.api.client import EvernoteClient
-from evernote.edam.notestore.ttypes import NoteFilter, NotesMetadataResultSpec
+from evernote.edam.notestore.ttypes import (NoteFilter, NotesMetadataResultSpec,
+                                            SyncChunkFilter)
 from evernote.edam.type.ttypes import NoteSortOrder
 
-import datetime, os, pytz
-from uuid import uuid4
+from binascii import hexlify
+from contextlib import closing, contextmanager
+from multiprocessing.pool import ThreadPool
+import datetime, hashlib, os, pytz, re, requests, tempfile
 
 
 EXTENSIONS = {
@@ -19,16 +25,36 @@ EXTENSIONS = {
     'application/pdf': '.pdf',
 }
 
+# Maximum number of entries requested per sync chunk.
+SYNC_CHUNK_SIZE = 500
 
-def _get_client(user):
-    token = user.social_auth.get(provider='evernote').extra_data['oauth_token']
-    client = EvernoteClient(token=token, sandbox=False)
-    return client, token
+# Resource bodies are downloaded in chunks of this size. Bodies up to
+#  RESOURCE_SPOOL_SIZE are kept in memory on the way to storage; larger ones
+#  are spooled to disk.
+CHUNK_SIZE = 64 * 1024
+RESOURCE_SPOOL_SIZE = getattr(settings, 'EVERNOTE_RESOURCE_SPOOL_SIZE', 1024 * 1024)
 
+DOWNLOAD_TIMEOUT = (3.05, 60)
 
-def _get_note_store(user):
-    client, token = _get_client(user)
-    return client.get_note_store(), token
+# Maximum number of resource bodies transferred at once for a single note.
+RESOURCE_WORKERS = getattr(settings, 'EVERNOTE_RESOURCE_WORKERS', 4)
+
+# Seconds for which a user's tag labels are cached. Tags that are created in
+#  the meantime are picked up right away (see get_tags); renamed tags are not.
+TAG_CACHE_TIMEOUT = getattr(settings, 'EVERNOTE_TAG_CACHE_TIMEOUT', 3600)
+
+
+@contextmanager
+def _note_store(user, store=None):
+    """
+    Use ``store`` (a ``(note store, token)`` tuple that is already checked
+    out), or else one from the :data:`blog.evernote_pool.pool`\.
+    """
+    if store is not None:
+        yield store
+    else:
+        with pool.checkout(user) as store:
+            yield store
 
 
 # EN timestamps are in mseconds.
@@ -62,21 +88,13 @@ def _get_external_resource(guid):
         return None
 
 
-def _create_content_file(raw_data, filename):
-    with open(os.path.join(settings.MEDIA_ROOT, filename), 'w') as f:
-        file_obj = File(f)
-        file_obj.write(raw_data)
-    return os.path.join(settings.MEDIA_ROOT, filename)
-
-
 def _resource_data(data):
     return {
         'id': data.guid,
         'filename': data.attributes.fileName,
         'mime': data.mime,
-        'data': {
-            'body': data.data.body,
-        }
+        'hash': hexlify(data.data.bodyHash),
+        'size': data.data.size,
     }
 
 
@@ -102,52 +120,133 @@ def _create_external_tag(datum):
     return external_tag, local_tag
 
 
-def _create_image_resource(creator, data):
-    mime_type = data.get('mime')
-    filename = data.get('filename')
-    if filename is None:
-        ext = EXTENSIONS[mime_type]
-        filename = str(uuid4()).replace('-', '') + ext
-    file_path = _create_content_file(data['data']['body'], filename)
-    img = Image.objects.create(
-        name = filename,
-        original_format = mime_type,
-        source = 'Evernote',
-        identifier = data['id'],
-        creator = creator,
-    )
-    img.image.save(filename, File(open(file_path, 'r')))
-    return img
-
-
-def _create_generic_resource(creator, data):
-    mime_type = data.get('mime')
-    filename = data.get('filename')
-    if filename is None:
-        ext = EXTENSIONS[mime_type]
-        filename = str(uuid4()).replace('-', '') + ext
-    file_path = _create_content_file(data['data']['body'], filename)
-    rsrc = GenericResource.objects.create(
-        name = filename,
-
-        original_format = mime_type,
-        source = 'Evernote',
-        identifier = data['id'],
-        creator = creator,
-    )
-    rsrc.file_obj.save(filename, File(open(file_path, 'r')))
-    return rsrc
+def _resource_url(token, resource_id):
+    """
+    Where the body of a resource can be downloaded over HTTP, on the same
+    service (production or sandbox) as the pooled note stores. The user's
+    shard is part of their token.
+    """
+    match = re.search(r'(?:^|:)S=(s[0-9]+)(?::|$)', token)
+    if match is None:
+        raise ValueError('Evernote token does not name a shard; cannot'
+                         ' download resource %s' % resource_id)
+    return '%s/shard/%s/res/%s' % (pool.service_url, match.group(1), resource_id)
 
-def _create_external_resource(creator, data, external_note):
-    if data['mime'].startswith('image'):
-        resource = _create_image_resource(creator, data)
-    else:
-        resource = _create_generic_resource(creator, data)
+
+def download_resource(token, datum):
+    """
+    Download the body of a resource, one chunk at a time, into a temporary
+    file (see :data:`.RESOURCE_SPOOL_SIZE`\).
+
+    Returns
+    -------
+    file
+        Positioned at the start of the body.
+    """
+    response = requests.post(_resource_url(token, datum['id']),
+                             data={'auth': token}, stream=True,
+                             timeout=DOWNLOAD_TIMEOUT)
+    f = tempfile.SpooledTemporaryFile(max_size=RESOURCE_SPOOL_SIZE)
+    try:
+        response.raise_for_status()
+        body_hash = hashlib.md5()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            body_hash.update(chunk)
+            f.write(chunk)
+        if body_hash.hexdigest() != datum['hash']:
+            raise IOError('Body of resource %s does not match its hash' % datum['id'])
+    except:
+        f.close()
+        raise
+    finally:
+        response.close()
+    f.seek(0)
+    return f
+
+
+def _storage_name(datum):
+    """
+    Content-addressed storage path for the body of a resource.
+    """
+    ext = os.path.splitext(datum.get('filename') or '')[1] or \
+        EXTENSIONS.get(datum['mime'], '')
+    return '/'.join(['evernote', datum['hash'] + ext.lower()])
+
+
+def store_resource(token, datum):
+    """
+    Stream the body of a resource to the default storage backend, unless a body
+    with the same hash is already there.
+
+    Returns
+    -------
+    str
+        Storage name of the body.
+    """
+    name = _storage_name(datum)
+    if not default_storage.exists(name):
+        with closing(download_resource(token, datum)) as f:
+            name = default_storage.save(name, File(f))
+    return name
+
+
+def store_resources(token, data, workers=RESOURCE_WORKERS):
+    """
+    Store the bodies of several resources (see :func:`.store_resource`\), up
+    to ``workers`` at a time. Each distinct body is transferred once.
+
+    Nothing here touches the database, so transfers can overlap freely.
+
+    Returns
+    -------
+    dict
+        Maps body hashes to storage names.
+    """
+    data = {datum['hash']: datum for datum in data}.values()
+    if len(data) < 2 or workers < 2:
+        return {datum['hash']: store_resource(token, datum) for datum in data}
+
+    threads = ThreadPool(min(workers, len(data)))
+    try:
+        names = threads.map(lambda datum: store_resource(token, datum), data)
+    finally:
+        threads.close()
+        threads.join()
+    return dict(zip([datum['hash'] for datum in data], names))
+
+
+def _create_resource(creator, datum, name):
+    fields = {
+        'name': datum.get('filename') or os.path.basename(name),
+        'original_format': datum['mime'],
+        'source': 'Evernote',
+        'identifier': datum['id'],
+        'creator': creator,
+    }
+    if datum['mime'].startswith('image'):
+        return Image.objects.create(image=name, **fields)
+    return GenericResource.objects.create(file_obj=name, **fields)
+
+
+def _create_external_resource(creator, datum, external_note, names):
+    """
+    Create an :class:`.ExternalEmbeddedResource` (and its own local resource)
+    for a resource in ``external_note``\. The body is stored under its hash
+    (see :func:`.store_resource`\), so an attachment shared by several notes
+    is only downloaded and uploaded once, but each import gets a separate
+    :class:`.Image` or :class:`.GenericResource` that can be edited or
+    deleted independently.
+
+    Only touches the database: ``names`` (from :func:`.store_resources`\)
+    must map the hash of the body to its storage name.
+    """
+    resource = _create_resource(creator, datum, names[datum['hash']])
 
     external = ExternalEmbeddedResource.objects.create(
-        external_id = data['id'],
+        external_id = datum['id'],
         external_source = ExternalEmbeddedResource.EVERNOTE,
         part_of = external_note,
+        body_hash = datum['hash'],
         local_resource = resource,
     )
 
@@ -164,8 +263,8 @@ def _create_content_relation(source, predicate_identifier, target):
 
 
 def list_notebooks(user):
-    note_store, token  = _get_note_store(user)
-    notebooks = note_store.listNotebooks()
+    with _note_store(user) as (note_store, token):
+        notebooks = note_store.listNotebooks()
     return [{
             'name': notebook.name,
             'id': notebook.guid,
@@ -176,15 +275,15 @@ def list_notebooks(user):
 
 
 def list_notes(user, notebook_id=None, offset=0, max_notes = 20):
-    note_store, token = _get_note_store(user)
     updated_filter = NoteFilter(order=NoteSortOrder.UPDATED,
                                 notebookGuid=notebook_id)
 
     result_spec = NotesMetadataResultSpec(includeTitle=True,
                                           includeUpdated=True,
                                           includeAttributes=True)
-    result = note_store.findNotesMetadata(token, updated_filter, offset,
-                                          max_notes, result_spec)
+    with _note_store(user) as (note_store, token):
+        result = note_store.findNotesMetadata(token, updated_filter, offset,
+                                              max_notes, result_spec)
     n = result.notes[0]
     return [{
         'title': note.title,
@@ -194,15 +293,56 @@ def list_notes(user, notebook_id=None, offset=0, max_notes = 20):
     } for note in result.notes]
 
 
-def get_tag(user, tag_id):
-    note_store, token = _get_note_store(user)
-    tag_data = note_store.getTag(token, tag_id)
+def get_tag(user, tag_id, store=None):
+    with _note_store(user, store) as (note_store, token):
+        tag_data = note_store.getTag(token, tag_id)
     return _tag_data(tag_data)
 
 
-def get_note(user, note_id):
-    note_store, token = _get_note_store(user)
-    note_data = note_store.getNote(token, note_id, True, True, True, True)
+def _tag_cache_key(user):
+    return 'blog.evernote_api.tags.%i' % user.id
+
+
+def list_tags(user, store=None, refresh=False):
+    """
+    Labels of all of the tags in ``user``\'s Evernote account, by GUID.
+
+    Tags are retrieved with a single ``listTags`` call, and cached for
+    :data:`.TAG_CACHE_TIMEOUT` seconds (unless ``refresh`` is set).
+    """
+    key = _tag_cache_key(user)
+    tags = None if refresh else cache.get(key)
+    if tags is None:
+        with _note_store(user, store) as (note_store, token):
+            tags = {tag.guid: tag.name for tag in note_store.listTags(token)}
+        cache.set(key, tags, TAG_CACHE_TIMEOUT)
+    return tags
+
+
+def get_tags(user, tag_ids, store=None):
+    """
+    Tag data for each of ``tag_ids``\, from :func:`.list_tags`\.
+
+    If any of the tags is unknown, the cached labels are refreshed (once). Tags
+    that still can't be found (e.g. from a shared notebook) are retrieved one
+    at a time.
+    """
+    tags = list_tags(user, store)
+    if any(tag_id not in tags for tag_id in tag_ids):
+        tags = list_tags(user, store, refresh=True)
+    return [
+        {'id': tag_id, 'label': tags[tag_id]} if tag_id in tags
+        else get_tag(user, tag_id, store=store)
+        for tag_id in tag_ids
+    ]
+
+
+def get_note(user, note_id, store=None):
+    with _note_store(user, store) as (note_store, token):
+        # Resource bodies are left out; see store_resource.
+        note_data = note_store.getNote(token, note_id, True, False, False, False)
+        tags = get_tags(user, note_data.tagGuids, store=(note_store, token)) \
+            if note_data.tagGuids is not None else []
 
     return {
         'id': note_data.guid,
@@ -215,13 +355,11 @@ def get_note(user, note_id):
         'resources': [
             _resource_data(resource) for resource in note_data.resources
         ] if note_data.resources is not None else [],
-        'tags': [
-            get_tag(user, tag_id) for tag_id in note_data.tagGuids
-        ] if note_data.tagGuids is not None else [],
+        'tags': tags,
     }
 
 
-def sync_note(user, note_id):
+def sync_note(user, note_id, store=None):
     """
     Create or update a :class:`.Note` from an Evernote note.
 
@@ -233,13 +371,16 @@ def sync_note(user, note_id):
     user
     note_id : str
         Evernote GUID.
+    store : tuple
+        (note store, token), if one is already checked out.
 
     Returns
     -------
     :class:`.ExternalNote`
     """
     external_note = _get_external_note(note_id)
-    en_note = get_note(user, note_id)
+    with _note_store(user, store) as (note_store, token):
+        en_note = get_note(user, note_id, store=(note_store, token))
 
     if en_note is None:
         raise RuntimeError('No note with id %s' % note_id)
@@ -251,7 +392,9 @@ def sync_note(user, note_id):
             external_source = ExternalNote.EVERNOTE,
         )
 
-    if external_note.part_of is None:
+    # Notes can move between notebooks.
+    if external_note.part_of is None or \
+            external_note.part_of.external_id != en_note['notebook_id']:
         external_notebook, _ = ExternalNotebook.objects.get_or_create(
             external_id=en_note['notebook_id'],
             defaults={
@@ -288,11 +431,16 @@ def sync_note(user, note_id):
     if not created:
         external_note.local_note.content = en_note['content']
 
-    # Handle note resources (e.g. images, PDFs).
-    for datum in en_note['resources']:
-        external_resource = _get_external_resource(datum['id'])
-        if external_resource is None:
-            external_resource, resource = _create_external_resource(user, datum, external_note)
+    # Handle note resources (e.g. images, PDFs). New bodies are transferred
+    #  concurrently first; the resources are then created in one transaction.
+    #  Bodies that are already in storage are not transferred again.
+    new_resources = [datum for datum in en_note['resources']
+                     if _get_external_resource(datum['id']) is None]
+    names = store_resources(token, new_resources)
+
+    with transaction.atomic():
+        for datum in new_resources:
+            external_resource, resource = _create_external_resource(user, datum, external_note, names)
             _create_content_relation(resource, 'P106i_forms_part_of', external_note.local_note)
 
     # Import Tags from Evernote, as well.
@@ -309,3 +457,81 @@ def sync_note(user, note_id):
     external_note.local_note.save()
     external_note.save()    # Log update event.
     return external_note
+
+
+def get_notebook_changes(note_store, token, notebook_id, after_usn,
+                         chunk_size=SYNC_CHUNK_SIZE):
+    """
+    Find the notes in a notebook that have changed since ``after_usn``\.
+
+    Sync chunks list every changed item in the account by update sequence
+    number (USN), so this walks the chunks after ``after_usn`` and picks out
+    the notes that belong to (or have left) the notebook. Chunks hold
+    metadata only; no note content is transferred.
+
+    Returns
+    -------
+    tuple
+        (GUIDs of changed notes in the notebook, GUIDs of notes that were
+        deleted or moved elsewhere, the highest USN seen)
+    """
+    sync_filter = SyncChunkFilter(includeNotes=True, includeExpunged=True)
+    update_count = note_store.getSyncState(token).updateCount
+
+    changed, removed = set(), set()
+    while after_usn < update_count:
+        chunk = note_store.getFilteredSyncChunk(token, after_usn, chunk_size,
+                                                sync_filter)
+        for note in chunk.notes or []:
+            if note.notebookGuid == notebook_id and note.deleted is None:
+                changed.add(note.guid)
+                removed.discard(note.guid)
+            else:    # In the trash, or in another notebook.
+                removed.add(note.guid)
+                changed.discard(note.guid)
+        for guid in chunk.expungedNotes or []:
+            removed.add(guid)
+            changed.discard(guid)
+
+        if chunk.chunkHighUSN is None:    # Nothing more to see.
+            break
+        after_usn = chunk.chunkHighUSN
+    return changed, removed, max(after_usn, update_count)
+
+
+def sync_notebook(user, notebook, chunk_size=SYNC_CHUNK_SIZE, store=None):
+    """
+    Bring the :class:`.Note`\s for an :class:`.ExternalNotebook` up to date.
+
+    Only notes that have changed since the last sync (as recorded in
+    :attr:`.ExternalNotebook.update_sequence_number`\) are retrieved. Notes
+    that were deleted in Evernote, or moved to another notebook, are
+    detached from the notebook; their local :class:`.Note`\s are kept.
+
+    Returns
+    -------
+    dict
+        Numbers of ``updated`` and ``removed`` notes.
+    """
+    # One note store for the whole sync.
+    with _note_store(user, store) as (note_store, token):
+        changed, removed, usn = get_notebook_changes(
+            note_store, token, notebook.external_id,
+            notebook.update_sequence_number, chunk_size)
+
+        for note_id in changed:
+            sync_note(user, note_id, store=(note_store, token))
+
+    removed, detached = list(removed), 0
+    for start in xrange(0, len(removed), SYNC_CHUNK_SIZE):
+        detached += ExternalNote.objects.filter(
+            part_of=notebook,
+            external_id__in=removed[start:start + SYNC_CHUNK_SIZE]
+        ).update(part_of=None)
+
+    # Only recorded once every change has been applied, so that an
+    #  interrupted sync is picked up again next time.
+    notebook.update_sequence_number = usn
+    notebook.synced = datetime.datetime.now(pytz.UTC)
+    notebook.save()
+    return {'updated': len(changed), 'removed': detached}
@@ -0,0 +1,133 @@
+from django.conf import settings
+
+from evernote.api.client import EvernoteClient
+from evernote.edam.error.ttypes import EDAMErrorCode, EDAMUserException
+
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+# Maximum number of idle note stores kept for each user.
+POOL_SIZE = getattr(settings, 'EVERNOTE_POOL_SIZE', 4)
+
+# Error codes meaning that Evernote will no longer accept a token.
+AUTH_ERRORS = (EDAMErrorCode.AUTH_EXPIRED, EDAMErrorCode.INVALID_AUTH)
+
+
+def get_token(user):
+    return user.social_auth.get(provider='evernote').extra_data['oauth_token']
+
+
+def token_expires(token):
+    """
+    Expiry time (in seconds since the epoch) embedded in an Evernote token, or
+    ``None`` if it doesn't have one.
+    """
+    match = re.search(r':E=([0-9a-f]+):', token)
+    return int(match.group(1), 16) / 1000. if match else None
+
+
+class NoteStorePool(object):
+    """
+    Authenticated Evernote note stores, kept for reuse.
+
+    Building a note store means reading the user's token and a round trip to
+    the user store to find the note store URL. A note store's transport can't
+    be used by more than one thread at a time, so a thread takes a store out
+    of the pool with :meth:`.checkout`\, and puts it back when it is done.
+
+    A user's stores are dropped when the token that they were built with
+    expires, or when Evernote rejects it. The next checkout reads the token
+    (which may have been re-authorized in the meantime) again.
+
+    ``sandbox`` selects the Evernote sandbox service rather than production.
+    """
+    def __init__(self, size=POOL_SIZE, sandbox=False, service_host=None):
+        self.size = size
+        self.sandbox = sandbox
+        self.service_host = service_host or \
+            ('sandbox.evernote.com' if sandbox else 'www.evernote.com')
+        self.lock = threading.Lock()
+        self.idle = {}      # User ID: list of (note store, token).
+        self.tokens = {}    # User ID: token.
+        self.created = 0
+
+    @property
+    def service_url(self):
+        """
+        Base URL of the service, e.g. for downloading resources over HTTP.
+        ``settings.EVERNOTE_SERVICE_URL`` overrides it (e.g. for a stand-in).
+        """
+        return getattr(settings, 'EVERNOTE_SERVICE_URL', None) or \
+            'https://%s' % self.service_host
+
+    def _get_token(self, user):
+        with self.lock:
+            token = self.tokens.get(user.id)
+        if token is not None:
+            expires = token_expires(token)
+            if expires is None or expires > time.time():
+                return token
+            self.discard(user)
+
+        token = get_token(user)
+        with self.lock:
+            self.tokens[user.id] = token
+        return token
+
+    def _create(self, token):
+        client = EvernoteClient(token=token, sandbox=self.sandbox,
+                                service_host=self.service_host)
+        note_store = client.get_note_store()
+        with self.lock:
+            self.created += 1
+        return note_store, token
+
+    def _release(self, user, store):
+        with self.lock:
+            if self.tokens.get(user.id) != store[1]:    # Token has changed.
+                return
+            idle = self.idle.setdefault(user.id, [])
+            if len(idle) < self.size:
+                idle.append(store)
+
+    @contextmanager
+    def checkout(self, user):
+        """
+        Use a ``(note store, token)`` for ``user``\, exclusively.
+
+        If the block raises, the store is not reused: its transport may have
+        been left in the middle of a request.
+        """
+        token = self._get_token(user)
+        with self.lock:
+            idle = self.idle.get(user.id)
+            store = idle.pop() if idle else None
+        if store is None:
+            store = self._create(token)
+
+        try:
+            yield store
+        except EDAMUserException as error:
+            if error.errorCode in AUTH_ERRORS:
+                self.discard(user)
+            raise
+        else:
+            self._release(user, store)
+
+    def discard(self, user):
+        """
+        Drop ``user``\'s stores and token.
+        """
+        with self.lock:
+            self.idle.pop(user.id, None)
+            self.tokens.pop(user.id, None)
+
+    def clear(self):
+        with self.lock:
+            self.idle.clear()
+            self.tokens.clear()
+
+
+pool = NoteStorePool(sandbox=getattr(settings, 'EVERNOTE_SANDBOX', False))
@@ -0,0 +1,237 @@
+from evernote.edam.notestore.ttypes import SyncChunk, SyncState
+from evernote.edam.type.ttypes import (Data, Note, NoteAttributes, Notebook,
+                                       Resource, ResourceAttributes, Tag)
+
+from collections import Counter
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import re
+import threading
+import time
+import urlparse
+from uuid import uuid4
+
+TOKEN = 'S=s1:U=1:A=stand-in:V=2:H=0'
+
+
+def _now():
+    return int(time.time() * 1000)    # EN timestamps are in mseconds.
+
+
+class StandInNoteStore(object):
+    """
+    An in-memory stand-in for an Evernote note store, for benchmarks and
+    tests. Implements the calls that :mod:`blog.evernote_api` makes, and
+    counts them in :attr:`.calls`\.
+
+    Use ``(store, TOKEN)`` wherever :mod:`blog.evernote_api` accepts a
+    ``store``\. Resource bodies are served over HTTP by :meth:`.serve`\, each
+    after ``delay`` seconds; :attr:`.max_downloads` is the largest number
+    that were in progress at once.
+    """
+    def __init__(self, delay=0):
+        self.update_count = 0
+        self.notebooks = {}
+        self.notes = {}
+        self.contents = {}
+        self.tags = {}
+        self.expunged = {}    # GUID: USN.
+        self.bodies = {}      # Resource GUID: body.
+        self.calls = Counter()
+        self.server = None
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.downloads = 0
+        self.max_downloads = 0
+
+    def _next_usn(self):
+        self.update_count += 1
+        return self.update_count
+
+    ## Setting up.
+
+    def add_notebook(self, name):
+        guid = str(uuid4())
+        self.notebooks[guid] = Notebook(guid=guid, name=name,
+                                        serviceCreated=_now(),
+                                        serviceUpdated=_now(),
+                                        updateSequenceNum=self._next_usn())
+        return guid
+
+    def add_tag(self, name):
+        guid = str(uuid4())
+        self.tags[guid] = Tag(guid=guid, name=name,
+                              updateSequenceNum=self._next_usn())
+        return guid
+
+    def add_note(self, notebook_guid, title, content='', tag_guids=None,
+                 resources=None):
+        """
+        ``resources`` is a list of (MIME type, body, filename).
+        """
+        guid = str(uuid4())
+        self.notes[guid] = Note(guid=guid, title=title, notebookGuid=notebook_guid,
+                                created=_now(), updated=_now(),
+                                tagGuids=tag_guids,
+                                attributes=NoteAttributes(),
+                                resources=[
+                                    self._resource(guid, *resource)
+                                    for resource in resources
+                                ] if resources else None,
+                                updateSequenceNum=self._next_usn())
+        self.contents[guid] = content
+        return guid
+
+    def _resource(self, note_guid, mime, body, filename=None):
+        guid = str(uuid4())
+        self.bodies[guid] = body
+        return Resource(guid=guid, noteGuid=note_guid, mime=mime,
+                        data=Data(bodyHash=hashlib.md5(body).digest(),
+                                  size=len(body)),
+                        attributes=ResourceAttributes(fileName=filename))
+
+    def update_note(self, guid, content=None, notebook_guid=None):
+        note = self.notes[guid]
+        if content is not None:
+            self.contents[guid] = content
+        if notebook_guid is not None:
+            note.notebookGuid = notebook_guid
+        note.updated = _now()
+        note.updateSequenceNum = self._next_usn()
+
+    def delete_note(self, guid):
+        """
+        Move a note to the trash.
+        """
+        self.notes[guid].deleted = _now()
+        self.notes[guid].updateSequenceNum = self._next_usn()
+
+    def expunge_note(self, guid):
+        del self.notes[guid]
+        del self.contents[guid]
+        self.expunged[guid] = self._next_usn()
+
+    ## Note store API.
+
+    def getSyncState(self, token):
+        self.calls['getSyncState'] += 1
+        return SyncState(currentTime=_now(), fullSyncBefore=0,
+                         updateCount=self.update_count)
+
+    def getFilteredSyncChunk(self, token, afterUSN, maxEntries, filter):
+        self.calls['getFilteredSyncChunk'] += 1
+        items = sorted(
+            [(note.updateSequenceNum, note.guid, note)
+             for note in self.notes.itervalues()
+             if note.updateSequenceNum > afterUSN] +
+            [(usn, guid, None) for guid, usn in self.expunged.iteritems()
+             if usn > afterUSN]
+        )[:maxEntries]
+
+        return SyncChunk(
+            currentTime=_now(),
+            chunkHighUSN=items[-1][0] if items else None,
+            updateCount=self.update_count,
+            notes=[Note(guid=note.guid, title=note.title,
+                        notebookGuid=note.notebookGuid,
+                        created=note.created, updated=note.updated,
+                        deleted=note.deleted, tagGuids=note.tagGuids,
+                        updateSequenceNum=note.updateSequenceNum)
+                   for usn, guid, note in items if note is not None],
+            expungedNotes=[guid for usn, guid, note in items if note is None],
+        )
+
+    def getNote(self, token, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        self.calls['getNote'] += 1
+        if withResourcesData:
+            raise NotImplementedError('Resource bodies are served by serve()')
+        note = self.notes[guid]
+        return Note(guid=note.guid, title=note.title,
+                    notebookGuid=note.notebookGuid,
+                    created=note.created, updated=note.updated,
+                    deleted=note.deleted, tagGuids=note.tagGuids,
+                    attributes=note.attributes, resources=note.resources,
+                    content=self.contents[guid] if withContent else None,
+                    updateSequenceNum=note.updateSequenceNum)
+
+    def getTag(self, token, guid):
+        self.calls['getTag'] += 1
+        return self.tags[guid]
+
+    def listTags(self, token):
+        self.calls['listTags'] += 1
+        return self.tags.values()
+
+    def listNotebooks(self, token):
+        self.calls['listNotebooks'] += 1
+        return self.notebooks.values()
+
+    ## Resource downloads.
+
+    def serve(self):
+        """
+        Serve resource bodies over HTTP, the way Evernote does.
+
+        Returns
+        -------
+        str
+            The service URL (for ``settings.EVERNOTE_SERVICE_URL``\).
+        """
+        self.server = ResourceServer(('127.0.0.1', 0), ResourceHandler)
+        self.server.note_store = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return 'http://127.0.0.1:%i' % self.server.server_port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class ResourceServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ResourceHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves ``POST /shard/<shard>/res/<GUID>`` (with an ``auth`` parameter).
+    """
+    def do_POST(self):
+        note_store = self.server.note_store
+        with note_store.lock:
+            note_store.calls['download'] += 1
+            note_store.downloads += 1
+            note_store.max_downloads = max(note_store.downloads,
+                                           note_store.max_downloads)
+        try:
+            time.sleep(note_store.delay)
+            self._respond(note_store)
+        finally:
+            with note_store.lock:
+                note_store.downloads -= 1
+
+    def _respond(self, note_store):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        form = urlparse.parse_qs(self.rfile.read(length))
+        match = re.match(r'^/shard/s[0-9]+/res/([^/]+)$', self.path)
+        body = note_store.bodies.get(match.group(1)) if match else None
+
+        if form.get('auth') != [TOKEN]:
+            self.send_response(401)
+            self.end_headers()
+        elif body is None:
+            self.send_response(404)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
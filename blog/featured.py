@@ -0,0 +1,35 @@
+from django.core.cache import cache
+
+from blog.models import Image
+
+import random
+
+CACHE_KEY = 'blog.featured_image_ids'
+
+
+def featured_image_ids():
+    """
+    Ids of all featured :class:`.Image`\s. Cached until
+    :func:`.invalidate_featured_images` is called.
+    """
+    ids = cache.get(CACHE_KEY)
+    if ids is None:
+        ids = list(Image.objects.filter(feature=True).values_list('id', flat=True))
+        cache.set(CACHE_KEY, ids, None)
+    return ids
+
+
+def invalidate_featured_images():
+    cache.delete(CACHE_KEY)
+
+
+def random_featured_image():
+    """
+    Choose a featured :class:`.Image` at random, or return ``None`` if there
+    are none. Picks from the cached id list, so the only query is a primary
+    key lookup.
+    """
+    ids = featured_image_ids()
+    if not ids:
+        return None
+    return Image.objects.filter(pk=random.choice(ids), feature=True).first()
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from reversion import revisions as reversion
+from reversion.helpers import generate_patch_html
+
+from blog.lru import LRUCache
+
+PAGE_SIZE = 20
+
+DIFF_CACHE_SIZE = getattr(settings, 'REVISION_DIFF_CACHE_SIZE', 256)
+
+
+def get_history(obj):
+    """
+    :class:`reversion.models.Version`\s for ``obj``\, newest first, with their
+    revisions and users joined in the same query.
+    """
+    return reversion.get_for_object(obj).select_related('revision',
+                                                        'revision__user')
+
+
+def get_latest_version(obj):
+    """
+    The most recent :class:`reversion.models.Version` of ``obj``\, or ``None``
+    if it has never been saved in a revision.
+    """
+    return get_history(obj).first()
+
+
+def get_version(obj, revision_id):
+    """
+    The :class:`reversion.models.Version` of ``obj`` saved in revision
+    ``revision_id``\. Raises ``Version.DoesNotExist``\.
+    """
+    return get_history(obj).get(revision_id=revision_id)
+
+
+def summarize_version(version):
+    """
+    Template- and JSON-ready metadata for a single ``version``\.
+    """
+    return {
+        'id': version.revision_id,
+        'date_created': version.revision.date_created,
+        'user': version.revision.user,
+        'comment': version.revision.comment,
+    }
+
+
+def get_history_page(obj, page=1, page_size=PAGE_SIZE):
+    """
+    One page of summaries (see :func:`.summarize_version`\) of the versions of
+    ``obj``\, newest first.
+
+    Returns
+    -------
+    tuple
+        (list of dicts, whether there is another page)
+    """
+    offset = (page - 1) * page_size
+    # Fetch one extra row to find out whether there is another page, rather
+    #  than COUNTing the whole history.
+    versions = list(get_history(obj)[offset:offset + page_size + 1])
+    return ([summarize_version(version) for version in versions[:page_size]],
+            len(versions) > page_size)
+
+
+diff_cache = LRUCache(DIFF_CACHE_SIZE)
+
+
+def get_patch_html(version, latest, field):
+    """
+    HTML diff of ``field`` between ``version`` and ``latest``\.
+
+    Versions are immutable, so a diff is fully determined by the object, the
+    two revisions and the field. Running diff-match-patch on a long note is
+    expensive, so diffs are kept in :data:`.diff_cache`\.
+    """
+    key = (version.content_type_id, version.object_id, version.revision_id,
+           latest.revision_id, field)
+    patch = diff_cache.get(key)
+    if patch is None:
+        patch = generate_patch_html(version, latest, field)
+        diff_cache.set(key, patch)
+    return mark_safe(patch)
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import ExternalNotebook, GenecologyUser
+from blog.evernote_standin import StandInNoteStore, TOKEN
+from blog import evernote_api
+
+import random
+import time
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Time full and incremental notebook syncs against an in-memory'
+            ' stand-in note store. Imported notes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notes', type=int, default=10000,
+                            help='Number of notes in the notebook.')
+        parser.add_argument('--changed', type=int, default=100,
+                            help='Number of notes to change before refreshing.')
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size',
+                            default=evernote_api.SYNC_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        store = StandInNoteStore()
+        notebook_id = store.add_notebook('Benchmark')
+        other_id = store.add_notebook('Elsewhere')
+        guids = [store.add_note(notebook_id, 'Note %i' % i, 'Content %i' % i)
+                 for i in xrange(options['notes'])]
+        for i in xrange(options['notes'] // 10):    # Should be skipped.
+            store.add_note(other_id, 'Other note %i' % i)
+
+        try:
+            with transaction.atomic():
+                user = GenecologyUser.objects.create_user('benchmark-sync', 'benchmark@example.com')
+                notebook = ExternalNotebook.objects.create(
+                    external_id=notebook_id,
+                    external_source=ExternalNotebook.EVERNOTE,
+                    belongs_to=user)
+
+                self._sync('Full sync', store, user, notebook, options['chunk_size'])
+
+                for guid in random.sample(guids, min(options['changed'], len(guids))):
+                    store.update_note(guid, content='Changed')
+                self._sync('Refresh', store, user, notebook, options['chunk_size'])
+                self._sync('Unchanged', store, user, notebook, options['chunk_size'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def _sync(self, label, store, user, notebook, chunk_size):
+        store.calls.clear()
+        started = time.time()
+        result = evernote_api.sync_notebook(user, notebook, chunk_size=chunk_size,
+                                            store=(store, TOKEN))
+        self.stdout.write('%-10s %8.2f s  %6i updated  calls: %s' % (
+            label, time.time() - started, result['updated'],
+            ', '.join('%s=%i' % item for item in sorted(store.calls.items()))))
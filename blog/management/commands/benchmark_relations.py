@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from blog.models import ContentRelation, Note, ExternalResource
+
+import random
+import time
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Time ContentRelation lookups (and show their query plans) as the'
+            ' relation table grows. Synthetic relations are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help='Comma-separated table sizes to measure at.')
+        parser.add_argument('--lookups', type=int, default=200,
+                            help='Number of lookups to time at each size.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        note_type = ContentType.objects.get_for_model(Note)
+        resource_type = ContentType.objects.get_for_model(ExternalResource)
+
+        try:
+            with transaction.atomic():
+                for size in sizes:
+                    self._grow(size, note_type, resource_type)
+                    self._measure(size, options['lookups'], note_type)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def _grow(self, size, note_type, resource_type):
+        missing = size - ContentRelation.objects.count()
+        while missing > 0:
+            batch = min(missing, 10000)
+            ContentRelation.objects.bulk_create([
+                ContentRelation(
+                    source_content_type=resource_type,
+                    source_instance_id=random.randint(1, size),
+                    target_content_type=note_type,
+                    target_instance_id=random.randint(1, size),
+                    description='',
+                ) for _ in xrange(batch)
+            ])
+            missing -= batch
+
+    def _measure(self, size, lookups, note_type):
+        targets = [random.randint(1, size) for _ in xrange(lookups)]
+        started = time.time()
+        for target_id in targets:
+            list(ContentRelation.objects.filter(target_content_type=note_type,
+                                                target_instance_id=target_id))
+        elapsed = (time.time() - started) / lookups
+
+        self.stdout.write('%10i relations: %8.3f ms per lookup' % (size, elapsed * 1000))
+
+        queryset = ContentRelation.objects.filter(target_content_type=note_type,
+                                                  target_instance_id=targets[0])
+        sql, params = queryset.query.sql_with_params()
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(explain + sql, params)
+            for row in cursor.fetchall():
+                self.stdout.write('    %s' % ' '.join(unicode(column) for column in row))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from blog.schema import import_schema
+
+import os
+import shutil
+import tempfile
+import time
+
+CIDOC_CRM = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                         'static', 'rdfs',
+                         'cidoc_crm_v6.2.1-draft-b-2015October.rdfs')
+
+
+class Command(BaseCommand):
+    help = ('Time import_schema (wall time and number of queries) on the'
+            ' bundled CIDOC CRM vocabulary. Imports are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Number of imports. The first parses the'
+                                 ' document; later ones use the cached snapshot.')
+        parser.add_argument('--schema', default=os.path.normpath(CIDOC_CRM),
+                            help='URL or local path of the RDF document.')
+
+    def handle(self, *args, **options):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(SCHEMA_CACHE_DIR=cache_dir):
+                for run in xrange(options['runs']):
+                    self._measure('cold' if run == 0 else 'cached', options['schema'])
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def _measure(self, label, schema):
+        started = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            result = import_schema(schema, 'Benchmark', dry_run=True)
+        self.stdout.write('%-7s %8.2f s  %5i queries  %i classes, %i properties' % (
+            label, time.time() - started, len(queries),
+            result.classes, result.properties))
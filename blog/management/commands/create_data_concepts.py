@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from concepts.models import ResolutionJob
+from blog.models import Data
+from blog.datasets import Dataset
+from blog.concept_links import is_authority_uri, create_concepts
+
+import itertools
+
+
+class Command(BaseCommand):
+    help = ('Create concepts (and profiles) for the authority URIs in Data'
+            ' files, so that the data viewer can link to them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_ids', nargs='*', type=int,
+                            help='Data to scan (default: all).')
+        parser.add_argument('--no-resolve', action='store_false', dest='resolve',
+                            default=True,
+                            help='Don\'t queue new concepts to be resolved.')
+
+    def handle(self, *args, **options):
+        queryset = Data.objects.all()
+        if options['data_ids']:
+            queryset = queryset.filter(pk__in=options['data_ids'])
+
+        uris = set()
+        for data_object in queryset:
+            dataset = Dataset(data_object)
+            rows = itertools.chain([dataset.header], dataset.rows(0, dataset.count))
+            found = set(cell for row in rows for cell in row if is_authority_uri(cell))
+            self.stdout.write('%s: %i URIs' % (data_object, len(found)))
+            uris |= found
+
+        concepts = create_concepts(uris)
+        self.stdout.write('Created %i concepts' % len(concepts))
+
+        if options['resolve']:
+            ResolutionJob.objects.enqueue_many(concepts)
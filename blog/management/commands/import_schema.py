@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+
+from blog.schema import import_schema, reimport_schema
+
+import time
+
+
+class Command(BaseCommand):
+    help = 'Import an RDF vocabulary as RDFSchema, RDFClass, and RDFProperty instances.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_url',
+                            help='URL or local path of the RDF document.')
+        parser.add_argument('schema_name')
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                            default=False,
+                            help='Roll back all changes once the import is complete.')
+        parser.add_argument('--incremental', action='store_true',
+                            dest='incremental', default=False,
+                            help='Update an existing schema, writing only the '
+                                 'classes and properties that have changed.')
+        parser.add_argument('--offline', action='store_true', dest='offline',
+                            default=False,
+                            help='Use the cached copy of the vocabulary, if '
+                                 'there is one, without retrieving it again.')
+
+    def handle(self, *args, **options):
+        started = time.time()
+
+        def progress(message):
+            self.stdout.write('[%6.2fs] %s' % (time.time() - started, message))
+
+        if options['incremental']:
+            return self.handle_incremental(progress, started, **options)
+
+        result = import_schema(options['schema_url'], options['schema_name'],
+                               dry_run=options['dry_run'], progress=progress,
+                               offline=options['offline'])
+
+        self.stdout.write(self.style.SUCCESS(
+            '%s %i classes (%i new) and %i properties (%i new) in %.2fs.' % (
+                'Would import' if options['dry_run'] else 'Imported',
+                result.classes, result.classes_created,
+                result.properties, result.properties_created,
+                time.time() - started)))
+
+    def handle_incremental(self, progress, started, **options):
+        diff = reimport_schema(options['schema_url'], options['schema_name'],
+                               dry_run=options['dry_run'], progress=progress,
+                               offline=options['offline'])
+
+        for label, identifiers in [
+                ('Added classes', diff.classes_added),
+                ('Modified classes', diff.classes_modified),
+                ('Removed classes', diff.classes_removed),
+                ('Added properties', diff.properties_added),
+                ('Modified properties', diff.properties_modified),
+                ('Removed properties', diff.properties_removed)]:
+            if identifiers:
+                self.stdout.write('%s (%i):' % (label, len(identifiers)))
+                for identifier in identifiers:
+                    self.stdout.write('    %s' % identifier)
+
+        if not diff.changed:
+            message = 'No changes.'
+        elif options['dry_run']:
+            message = 'Dry run; no changes were written.'
+        else:
+            message = 'Updated schema %s.' % diff.schema
+        self.stdout.write(self.style.SUCCESS(
+            '%s (%.2fs)' % (message, time.time() - started)))
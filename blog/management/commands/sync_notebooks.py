@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import ExternalNotebook
+from blog import evernote_api
+
+import time
+
+
+class Command(BaseCommand):
+    help = ('Import notes that have changed in Evernote notebooks since they'
+            ' were last synced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('notebook_ids', nargs='*',
+                            help='Evernote GUIDs of notebooks (default: all).')
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size',
+                            default=evernote_api.SYNC_CHUNK_SIZE,
+                            help='Entries per sync chunk.')
+
+    def handle(self, *args, **options):
+        notebooks = ExternalNotebook.objects.select_related('belongs_to')
+        if options['notebook_ids']:
+            notebooks = notebooks.filter(external_id__in=options['notebook_ids'])
+
+        for notebook in notebooks:
+            started = time.time()
+            result = evernote_api.sync_notebook(notebook.belongs_to, notebook,
+                                                chunk_size=options['chunk_size'])
+            self.stdout.write('%s: %i updated, %i removed (USN %i, %.1f s)' % (
+                notebook.external_id, result['updated'], result['removed'],
+                notebook.update_sequence_number, time.time() - started))
@@ -6,11 +6,113 @@ from django.db import migrations, models
 import django.db.models.deletion
 from django.conf import settings
 
-from blog.schema import *
+import os
+import rdflib
+from rdflib.term import URIRef
+
+CIDOC_CRM_URL = 'http://cidoc-crm.org/rdfs/cidoc_crm_v6.2.1-draft-b-2015October.rdfs'
+CIDOC_CRM_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                              'static', 'rdfs',
+                              'cidoc_crm_v6.2.1-draft-b-2015October.rdfs')
+
+PROPERTY = URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#Property')
+TYPE = URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#type')
+CLASS = URIRef('http://www.w3.org/2000/01/rdf-schema#Class')
+OWL_CLASS = URIRef('http://www.w3.org/2002/07/owl#Class')
+DESCRIPTION = URIRef('http://purl.org/dc/terms/description')
+COMMENT = URIRef('http://www.w3.org/2000/01/rdf-schema#comment')
+LABEL = URIRef('http://www.w3.org/2000/01/rdf-schema#label')
+RANGE = URIRef('http://www.w3.org/2000/01/rdf-schema#range')
+DOMAIN = URIRef('http://www.w3.org/2000/01/rdf-schema#domain')
+SUBPROPERTYOF = URIRef('http://www.w3.org/2000/01/rdf-schema#subPropertyOf')
+SUBCLASSOF = URIRef('http://www.w3.org/2000/01/rdf-schema#subClassOf')
+
+
+# A frozen copy of the importer as it was when this migration was written.
+#  blog.schema.import_schema works against the current models (and maintains
+#  tables, like the class closure, that don't exist yet at this point).
+
+def _identifier(uri_ref):
+    delim = '#' if '#' in uri_ref else '/'
+    return unicode(uri_ref).split(delim)[-1]
+
+
+def _get_object(g, s, p):
+    objects = list(g.objects(s, p))
+    return objects[0] if objects else None
+
+
+def _get_label(g, s):
+    labels = list(g.objects(s, LABEL))
+    for label in labels:
+        if getattr(label, 'language', None) == 'en':
+            return label
+    return labels[0] if labels else _identifier(s)
+
+
+def _get_comment(g, s):
+    # We prefer to use the description, but comment is fine, too.
+    return _get_object(g, s, DESCRIPTION) or _get_object(g, s, COMMENT)
 
 
 def load_cidoc_crm(apps, schema_editor):
-    import_schema('http://cidoc-crm.org/rdfs/cidoc_crm_v6.2.1-draft-b-2015October.rdfs', 'CIDOC CRM 6.0')
+    RDFSchema = apps.get_model("blog", "RDFSchema")
+    RDFClass = apps.get_model("blog", "RDFClass")
+    RDFProperty = apps.get_model("blog", "RDFProperty")
+
+    # The bundled copy of the same document, so that migrating (and creating
+    #  a test database) doesn't depend on cidoc-crm.org.
+    g = rdflib.Graph()
+    g.parse(CIDOC_CRM_PATH, publicID=CIDOC_CRM_URL, format='xml')
+
+    schema = RDFSchema.objects.create(name='CIDOC CRM 6.0', uri=CIDOC_CRM_URL)
+
+    def get_class(identifier, **defaults):
+        defaults['partOf'] = schema
+        return RDFClass.objects.get_or_create(identifier=identifier,
+                                              defaults=defaults)[0]
+
+    # Literal is an RDFClass, too! At least it's easier, that way.
+    classes = {u'Literal': get_class(u'Literal', label=u'Literal')}
+    class_refs = set(g.subjects(TYPE, CLASS)) | set(g.subjects(TYPE, OWL_CLASS))
+    for class_ref in class_refs:
+        classes[_identifier(class_ref)] = get_class(
+            _identifier(class_ref), label=_get_label(g, class_ref),
+            comment=_get_comment(g, class_ref))
+
+    for class_ref in class_refs:
+        parent = _get_object(g, class_ref, SUBCLASSOF)
+        if parent is not None and _identifier(parent) in classes:
+            instance = classes[_identifier(class_ref)]
+            instance.subClassOf = classes[_identifier(parent)]
+            instance.save()
+
+    properties = {}
+    property_refs = set(g.subjects(TYPE, PROPERTY))
+    for property_ref in property_refs:
+        instance = RDFProperty.objects.get_or_create(
+            identifier=_identifier(property_ref),
+            defaults={
+                'label': _get_label(g, property_ref),
+                'comment': _get_comment(g, property_ref),
+                'partOf': schema,
+            })[0]
+        for field, predicate in (('domain', DOMAIN), ('range', RANGE)):
+            class_ref = _get_object(g, property_ref, predicate)
+            if class_ref is not None:
+                identifier = _identifier(class_ref)
+                if identifier not in classes:
+                    classes[identifier] = get_class(identifier)
+                setattr(instance, field, classes[identifier])
+        instance.save()
+        properties[_identifier(property_ref)] = instance
+
+    for property_ref in property_refs:
+        parent = _get_object(g, property_ref, SUBPROPERTYOF)
+        if parent is not None and _identifier(parent) in properties:
+            instance = properties[_identifier(property_ref)]
+            instance.subPropertyOf = properties[_identifier(parent)]
+            instance.save()
 
 
 def delete_cidoc_crm(apps, schema_editor):
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_closure(apps, schema_editor):
+    RDFClass = apps.get_model('blog', 'RDFClass')
+    RDFClassClosure = apps.get_model('blog', 'RDFClassClosure')
+
+    parent_of = dict(RDFClass.objects.values_list('id', 'subClassOf_id'))
+    rows = []
+    for descendant_id in parent_of:
+        ancestor_id, depth, seen = descendant_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(RDFClassClosure(ancestor_id=ancestor_id,
+                                        descendant_id=descendant_id,
+                                        depth=depth))
+            ancestor_id, depth = parent_of.get(ancestor_id), depth + 1
+    RDFClassClosure.objects.bulk_create(rows, batch_size=500)
+
+
+def clear_closure(apps, schema_editor):
+    apps.get_model('blog', 'RDFClassClosure').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0025_image_feature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RDFClassClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_closure', to='blog.RDFClass')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_closure', to='blog.RDFClass')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='rdfclassclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='rdfclassclosure',
+            index_together=set([('descendant', 'ancestor')]),
+        ),
+        migrations.RunPython(build_closure, clear_closure),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('blog', '0026_rdfclassclosure'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='contentrelation',
+            index_together=set([('source_content_type', 'source_instance_id', 'instance_of'), ('target_content_type', 'target_instance_id', 'instance_of')]),
+        ),
+    ]
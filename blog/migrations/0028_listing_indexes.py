@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0027_contentrelation_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='note',
+            index_together=set([('created', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='post',
+            index_together=set([('published', 'created', 'id')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0028_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externalnotebook',
+            name='update_sequence_number',
+            field=models.IntegerField(default=0, help_text="The Evernote account's update count as of the last notebook sync. Only notes changed after this are retrieved next time."),
+        ),
+        migrations.AddField(
+            model_name='externalnotebook',
+            name='synced',
+            field=models.DateTimeField(null=True, blank=True),
+        ),
+    ]
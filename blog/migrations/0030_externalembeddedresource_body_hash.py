@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0029_externalnotebook_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externalembeddedresource',
+            name='body_hash',
+            field=models.CharField(db_index=True, max_length=32, blank=True, help_text='MD5 hash (hex) of the resource body. Resources with the same body share a single stored file.'),
+        ),
+    ]
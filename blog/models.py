@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import models, transaction, connection
+from django.db.models import Count, F
 from django.contrib.auth.models import (
     BaseUserManager, AbstractBaseUser, PermissionsMixin, Permission
 )
@@ -18,6 +19,8 @@ from reversion import revisions as reversion
 import re
 import bleach
 import datetime
+import threading
+from collections import defaultdict
 
 
 def help_text(s):
@@ -28,6 +31,36 @@ def help_text(s):
     return re.sub('\s+', ' ', s).strip()
 
 
+class ContentRelationQuerySet(models.QuerySet):
+    def _about(self, direction, objects):
+        query = models.Q(pk__in=[])
+        for obj in objects:
+            query |= models.Q(**{
+                '%s_content_type' % direction: ContentType.objects.get_for_model(obj),
+                '%s_instance_id' % direction: obj.pk,
+            })
+        return self.filter(query)
+
+    def to_objects(self, *objects):
+        """
+        Relations whose ``target`` is any of ``objects``\.
+        """
+        return self._about('target', objects)
+
+    def from_objects(self, *objects):
+        """
+        Relations whose ``source`` is any of ``objects``\.
+        """
+        return self._about('source', objects)
+
+    def with_related(self):
+        """
+        Load ``instance_of`` with a join, and ``source`` and ``target`` with one
+        query per content type, rather than several queries per relation.
+        """
+        return self.select_related('instance_of').prefetch_related('source', 'target')
+
+
 class ContentRelation(models.Model):
     instance_of = models.ForeignKey('RDFProperty',
                                     related_name='content_relations',
@@ -58,6 +91,14 @@ class ContentRelation(models.Model):
     target_instance_id = models.IntegerField(default=0)
     target = GenericForeignKey('target_content_type', 'target_instance_id')
 
+    objects = ContentRelationQuerySet.as_manager()
+
+    class Meta:
+        index_together = (
+            ('source_content_type', 'source_instance_id', 'instance_of'),
+            ('target_content_type', 'target_instance_id', 'instance_of'),
+        )
+
 
 class Content(models.Model):
     class Meta:
@@ -118,6 +159,11 @@ class ExternalEmbeddedResource(models.Model):
     external_source = models.CharField(max_length=2, choices=NOTE_SOURCES)
     updated = models.DateTimeField(auto_now=True)
     part_of = models.ForeignKey('ExternalNote', related_name='resources')
+    body_hash = models.CharField(max_length=32, blank=True, db_index=True,
+                                 help_text=help_text("""
+    MD5 hash (hex) of the resource body. Resources with the same body share a
+    single stored file.
+    """))
 
     local_resource_content_type = models.ForeignKey(ContentType,
                                             related_name='lrc')
@@ -136,6 +182,12 @@ class ExternalNotebook(models.Model):
     updated = models.DateTimeField(auto_now=True)
     belongs_to = models.ForeignKey('GenecologyUser', related_name='external_notebooks')
 
+    update_sequence_number = models.IntegerField(default=0, help_text=help_text("""
+    The Evernote account's update count as of the last notebook sync. Only
+    notes changed after this are retrieved next time.
+    """))
+    synced = models.DateTimeField(null=True, blank=True)
+
 
 class ExternalNote(models.Model):
     EVERNOTE = 'EN'
@@ -159,6 +211,9 @@ class Note(Content):
     title = models.CharField(max_length=255)
     content = MarkupField(markup_type='markdown')
 
+    class Meta:
+        index_together = (('created', 'id'),)
+
     @property
     def summary(self):
         content = self._content_rendered[:200] + u'...'
@@ -339,6 +394,8 @@ class Post(Content):
 
     published = models.BooleanField(default=False)
 
+    class Meta:
+        index_together = (('published', 'created', 'id'),)
 
     @property
     def title_condensed(self):
@@ -356,15 +413,86 @@ class Post(Content):
         return self.title
 
 
+class TagManager(models.Manager):
+    def _recent_ids(self, links, field, recent, published=None):
+        """
+        ``tag id -> [item id]`` for (up to) the ``recent`` newest items linked
+        to each tag, from a single query: a link is kept only if fewer than
+        ``recent`` items with the same tag are newer than its own.
+        """
+        qn = connection.ops.quote_name
+        through = qn(links.model._meta.db_table)
+        column = qn(links.model._meta.get_field(field).column)
+        tag_column = qn(links.model._meta.get_field('tag').column)
+        table = qn(links.model._meta.get_field(field).related_model._meta.db_table)
+        condition, params = '', []
+        if published is not None:
+            condition, params = 'AND newer.published = %s', [published]
+
+        newer = """(SELECT COUNT(*) FROM {through} newer_link
+                    INNER JOIN {table} newer ON newer.id = newer_link.{column}
+                    WHERE newer_link.{tag_column} = {through}.{tag_column} {condition}
+                    AND (newer.created > {table}.created
+                         OR (newer.created = {table}.created AND newer.id > {table}.id))
+                   ) < %s""".format(through=through, table=table, column=column,
+                                    tag_column=tag_column, condition=condition)
+        ids = defaultdict(list)
+        for tag_id, item_id in links.filter(**{'%s__created__isnull' % field: False})\
+                                    .extra(where=[newer], params=params + [recent])\
+                                    .values_list('tag', field):
+            ids[tag_id].append(item_id)
+        return ids
+
+    def with_counts(self, recent=0):
+        """
+        All :class:`.Tag`\s, each with ``post_count`` (published posts only) and
+        ``note_count`` attributes. If ``recent`` is non-zero, each tag also gets
+        ``recent_posts`` and ``recent_notes`` lists with (up to) that many of
+        its newest posts and notes.
+
+        Counts are aggregated in the database (one query per model), so only a
+        row per tag is transferred. Recent items take two more queries per
+        model, however many tags there are: one for the (bounded) ids of each
+        tag's newest items, and one to load them.
+        """
+        tags = list(self.all())
+        for model, prefix, links, published in [
+                (Post, 'post', Post.tags.through.objects.filter(post__published=True), True),
+                (Note, 'note', Note.tags.through.objects.all(), None)]:
+            counts = dict(links.order_by().values('tag')
+                               .annotate(count=Count('id'))
+                               .values_list('tag', 'count'))
+            for tag in tags:
+                setattr(tag, '%s_count' % prefix, counts.get(tag.id, 0))
+
+            if not recent:
+                continue
+            ids = self._recent_ids(links, prefix, recent, published)
+            items = {}
+            if ids:
+                items = model.objects.select_related('creator').in_bulk(
+                    [i for values in ids.values() for i in values])
+            for tag in tags:
+                setattr(tag, 'recent_%ss' % prefix, sorted(
+                    [items[i] for i in ids.get(tag.id, []) if i in items],
+                    key=lambda item: (item.created, item.id), reverse=True))
+        return tags
+
+
 class Tag(models.Model):
     slug = models.SlugField(max_length=100)
     title = models.CharField(max_length=255)
     description = models.TextField()
 
+    objects = TagManager()
+
     def __unicode__(self):
         return self.slug
 
     def num_posts(self):
+        # Use counts from TagManager.with_counts(), if available.
+        if hasattr(self, 'post_count') and hasattr(self, 'note_count'):
+            return self.post_count + self.note_count
         return self.post_set.filter(published=True).count() + self.note_set.filter().count()
 
 
@@ -478,16 +606,7 @@ class RDFClass(models.Model):
         """
         QuerySet containing this :class:`.RDFClass` and all of its children.
         """
-        def traverse_down(rdf_class):
-            classes = [rdf_class]
-            if rdf_class.superClassOf.count() > 0:
-                for sub_class in rdf_class.superClassOf.all():
-                    classes += traverse_down(sub_class)
-            return classes
-
-        # We want a QuerySet rather than a list. Maybe there is a less hacky
-        #  way to do this....
-        return RDFClass.objects.filter(id__in=[obj.id for obj in traverse_down(self)]).order_by('label')
+        return RDFClass.objects.filter(ancestor_closure__ancestor=self).order_by('label')
 
     @property
     def children_instances(self):
@@ -495,22 +614,14 @@ class RDFClass(models.Model):
         QuerySet containing all instances of this :class:`.RDFClass` and its
         children.
         """
-        return Entity.objects.filter(id__in=[instance.id for rdf_class in self.children for instance in rdf_class.instances.all()])
+        return Entity.objects.filter(instance_of__ancestor_closure__ancestor=self)
 
     @property
     def parents(self):
         """
         QuerySet containing this :class:`.RDFClass` and all of its parents.
         """
-        def traverse_up(rdf_class):
-            classes = [rdf_class]
-            if rdf_class.subClassOf:
-                classes += traverse_up(rdf_class.subClassOf)
-            return classes
-
-        # We want a QuerySet rather than a list. Maybe there is a less hacky
-        #  way to do this....
-        return RDFClass.objects.filter(id__in=[obj.id for obj in traverse_up(self)]).order_by('label')
+        return RDFClass.objects.filter(descendant_closure__descendant=self).order_by('label')
 
     @property
     def available_properties(self):
@@ -518,7 +629,81 @@ class RDFClass(models.Model):
         QuerySet containing all :class:`.RDFProperty` that can be instantiated
         with an instance of this :class:`.RDFClass` as its ``source``.
         """
-        return RDFProperty.objects.filter(domain_id__in=self.parents)
+        return RDFProperty.objects.filter(id__in=rdf_property_index.properties_for(self.id))
+
+
+class RDFClassClosureManager(models.Manager):
+    """
+    Maintains the ancestor/descendant closure of the ``subClassOf`` hierarchy.
+    """
+
+    def rebuild(self):
+        """
+        Regenerate the entire closure table from ``RDFClass.subClassOf``.
+        """
+        parent_of = dict(RDFClass.objects.values_list('id', 'subClassOf_id'))
+
+        rows = []
+        for descendant_id in parent_of:
+            ancestor_id, depth, seen = descendant_id, 0, set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)    # Guard against subClassOf cycles.
+                rows.append(self.model(ancestor_id=ancestor_id,
+                                       descendant_id=descendant_id,
+                                       depth=depth))
+                ancestor_id, depth = parent_of.get(ancestor_id), depth + 1
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(rows, batch_size=500)
+        rdf_property_index.invalidate()
+
+    def refresh(self, rdf_class):
+        """
+        Re-link ``rdf_class`` and its subtree beneath its current
+        ``subClassOf``. Called whenever an :class:`.RDFClass` is saved.
+        """
+        with transaction.atomic():
+            self.get_or_create(ancestor=rdf_class, descendant=rdf_class,
+                               defaults={'depth': 0})
+
+            subtree = dict(self.filter(ancestor=rdf_class)
+                               .values_list('descendant_id', 'depth'))
+
+            # Detach the subtree from its former ancestors.
+            self.filter(descendant_id__in=subtree.keys())\
+                .exclude(ancestor_id__in=subtree.keys()).delete()
+
+            if rdf_class.subClassOf_id is None or rdf_class.subClassOf_id in subtree:
+                return
+
+            # ...and attach it to the ancestors of the new parent.
+            ancestors = self.filter(descendant_id=rdf_class.subClassOf_id)\
+                            .values_list('ancestor_id', 'depth')
+            self.bulk_create([
+                self.model(ancestor_id=ancestor_id,
+                           descendant_id=descendant_id,
+                           depth=depth + 1 + subdepth)
+                for ancestor_id, depth in ancestors
+                for descendant_id, subdepth in subtree.items()
+            ], batch_size=500)
+
+
+class RDFClassClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair in the ``subClassOf`` hierarchy,
+    including the reflexive pair for each :class:`.RDFClass`\. Lets us
+    retrieve all parents or all children of a class in a single query.
+    """
+    ancestor = models.ForeignKey('RDFClass', related_name='descendant_closure')
+    descendant = models.ForeignKey('RDFClass', related_name='ancestor_closure')
+    depth = models.PositiveIntegerField(default=0)
+
+    objects = RDFClassClosureManager()
+
+    class Meta:
+        unique_together = (('ancestor', 'descendant'),)
+        index_together = (('descendant', 'ancestor'),)
 
 
 class RDFProperty(models.Model):
@@ -546,6 +731,115 @@ class RDFProperty(models.Model):
         return self.identifier
 
 
+class RDFPropertyIndexVersion(models.Model):
+    """
+    A single row, bumped whenever classes or properties change, so that every
+    process knows to rebuild its :class:`.RDFPropertyIndex`\.
+    """
+    version = models.PositiveIntegerField(default=0)
+
+
+class RDFPropertyIndex(object):
+    """
+    In-process map of the RDF hierarchy, used to answer "which properties can
+    an instance of this class be the source of?" and "is this class in the
+    domain/range of that property?" without loading the hierarchy.
+
+    The index is built lazily from :class:`.RDFClassClosure` and
+    :class:`.RDFProperty` (three queries), and is rebuilt after
+    :meth:`.invalidate` is called. The version number lives in the database
+    (:class:`.RDFPropertyIndexVersion`\), so each lookup costs a single-row
+    query, and a change is seen by every process as soon as it is committed.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ancestors = {}        # RDFClass id -> frozenset of ancestor ids.
+        self._applicable = {}       # RDFClass id -> frozenset of property ids.
+        self._constraints = {}      # RDFProperty id -> (domain id, range id).
+
+    def _current_version(self):
+        return RDFPropertyIndexVersion.objects.filter(pk=1)\
+                                              .values_list('version', flat=True)\
+                                              .first() or 0
+
+    def _ensure(self):
+        version = self._current_version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version != version:
+                self.build(version)
+
+    def build(self, version=None):
+        """
+        Load the hierarchy and property constraints from the database.
+
+        The version is read first, so that a change made while we load is
+        picked up by the next lookup rather than stamped as already loaded.
+        """
+        if version is None:
+            version = self._current_version()
+
+        ancestors = defaultdict(set)
+        for ancestor_id, descendant_id in RDFClassClosure.objects.values_list('ancestor_id', 'descendant_id'):
+            ancestors[descendant_id].add(ancestor_id)
+
+        by_domain, constraints = defaultdict(set), {}
+        for property_id, domain_id, range_id in RDFProperty.objects.values_list('id', 'domain_id', 'range_id'):
+            by_domain[domain_id].add(property_id)
+            constraints[property_id] = (domain_id, range_id)
+
+        self._ancestors = {
+            class_id: frozenset(ids) for class_id, ids in ancestors.items()
+        }
+        self._applicable = {
+            class_id: frozenset(property_id for ancestor_id in ids
+                                for property_id in by_domain.get(ancestor_id, ()))
+            for class_id, ids in ancestors.items()
+        }
+        self._constraints = constraints
+        self._version = version
+
+    def invalidate(self):
+        """
+        Discard the index in this and every other process.
+        """
+        updated = RDFPropertyIndexVersion.objects.filter(pk=1)\
+                                                 .update(version=F('version') + 1)
+        if not updated:
+            RDFPropertyIndexVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        self._version = None
+
+    def properties_for(self, class_id):
+        """
+        Ids of the :class:`.RDFProperty` instances whose domain is the
+        :class:`.RDFClass` ``class_id`` or one of its ancestors.
+        """
+        self._ensure()
+        return self._applicable.get(class_id, frozenset())
+
+    def is_a(self, class_id, target_class_id):
+        """
+        Whether ``class_id`` is ``target_class_id`` or one of its descendants.
+        """
+        self._ensure()
+        return target_class_id in self._ancestors.get(class_id, ())
+
+    def in_domain(self, property_id, class_id):
+        self._ensure()
+        domain_id, _ = self._constraints.get(property_id, (None, None))
+        return domain_id in self._ancestors.get(class_id, ())
+
+    def in_range(self, property_id, class_id):
+        self._ensure()
+        _, range_id = self._constraints.get(property_id, (None, None))
+        return range_id in self._ancestors.get(class_id, ())
+
+
+rdf_property_index = RDFPropertyIndex()
+
+
 class Entity(models.Model):
     """
     """
@@ -569,13 +863,10 @@ class Entity(models.Model):
         the :class:`.RDFClass` instance ``target_class`` (including its
         descendants).
         """
-
-        def traverse_up(rdf_class):     # Collects all ancestor RDFClasses.
-            if rdf_class.subClassOf:
-                return [rdf_class] + traverse_up(rdf_class.subClassOf)
-            return [rdf_class]    # Reached the highest level of the lineage.
-
-        return target_class in traverse_up(self.instance_of)
+        if target_class is None:
+            return False
+        return RDFClassClosure.objects.filter(ancestor=target_class,
+                                              descendant_id=self.instance_of_id).exists()
 
     @property
     def time_span(self):
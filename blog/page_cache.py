@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from functools import wraps
+import hashlib
+
+# Cached pages are replaced whenever a version changes, so this is just a
+#  backstop.
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+HITS_KEY = 'blog.page_cache.hits'
+MISSES_KEY = 'blog.page_cache.misses'
+
+
+def get_cache():
+    """
+    The cache used for rendered pages and fragments, and for the version
+    numbers that key them. Configured by ``settings.PAGE_CACHE_ALIAS``\.
+    """
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model, pk=None):
+    if pk is None:
+        return 'blog.page_cache.version.%s' % model._meta.label_lower
+    return 'blog.page_cache.version.%s.%s' % (model._meta.label_lower, pk)
+
+
+def _increment(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:    # Key is missing or was evicted.
+        cache.set(key, 1, None)
+
+
+def bump_version(model, pk=None):
+    """
+    Invalidate cached pages for the instance ``pk`` of ``model``\, as well as
+    pages that depend on ``model`` as a whole.
+    """
+    if pk is not None:
+        _increment(_version_key(model, pk))
+    _increment(_version_key(model))
+
+
+def page_version(model=None, pk=None, depends_on=()):
+    """
+    A string that changes whenever the instance ``pk`` of ``model``\, or any
+    instance of the models in ``depends_on``\, is changed.
+    """
+    keys = [_version_key(dependency) for dependency in depends_on]
+    if model is not None:
+        keys.insert(0, _version_key(model, pk))
+    versions = get_cache().get_many(keys)
+    return ';'.join('%s=%s' % (key.split('.', 3)[-1], versions.get(key, 0))
+                    for key in keys)
+
+
+def is_anonymous(request):
+    """
+    Whether ``request`` is (certainly) from an anonymous user. Checks only the
+    session cookie, so that we don't load the session from the database.
+    """
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': values.get(HITS_KEY, 0),
+        'misses': values.get(MISSES_KEY, 0),
+    }
+
+
+def cache_public_page(model=None, pk_kwarg=None, depends_on=(),
+                      timeout=DEFAULT_TIMEOUT):
+    """
+    Serve anonymous GET requests for the decorated view from the cache.
+
+    Pages are keyed on the full path (including query parameters) and on
+    :func:`.page_version`\, so a page is re-rendered as soon as the object
+    that it displays (identified by the view's ``pk_kwarg`` argument), or any
+    instance of a model in ``depends_on``\, changes. Versions are bumped by
+    receivers in :mod:`blog.signals`\. Cache hits touch neither the view nor
+    the database. The response's headers are cached along with its content;
+    responses that set cookies are not cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or not is_anonymous(request):
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            pk = kwargs.get(pk_kwarg) if pk_kwarg else None
+            version = page_version(model, pk, depends_on)
+            key = 'blog.page_cache.page.%s' % hashlib.sha1(
+                (u'%s|%s' % (request.get_full_path(), version)).encode('utf-8')
+            ).hexdigest()
+
+            cached = cache.get(key)
+            if cached is not None:
+                _increment(HITS_KEY)
+                content, headers = cached
+                response = HttpResponse(content)
+                for header, value in headers:
+                    response[header] = value
+                return response
+
+            _increment(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            # Cookies set for this visitor (e.g. a CSRF token) mustn't be
+            #  served to anyone else.
+            if response.status_code == 200 and not response.streaming \
+                    and not response.cookies:
+                cache.set(key, (response.content, response.items()), timeout)
+            return response
+        return wrapper
+    return decorator
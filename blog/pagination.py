@@ -0,0 +1,67 @@
+from django.db.models import Q
+
+import datetime
+import pytz
+
+PAGE_SIZE = 10
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+
+def encode_cursor(obj):
+    """
+    Generate an opaque cursor for the position just after ``obj`` in a
+    listing ordered by ``(-created, -id)``.
+    """
+    delta = obj.created - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+    return '%i_%i' % (microseconds, obj.id)
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of :func:`.encode_cursor`\. Returns a ``(created, id)`` tuple, or
+    ``None`` if ``cursor`` is malformed.
+    """
+    try:
+        microseconds, pk = [int(part) for part in cursor.rsplit('_', 1)]
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + datetime.timedelta(microseconds=microseconds), pk
+
+
+def keyset_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    Retrieve one page of ``queryset``\, newest first.
+
+    Rather than OFFSET, which makes the database walk past every earlier
+    row, each page starts strictly after the ``(created, id)`` of the last row
+    of the previous page. With an index on those columns, every page costs
+    the same, however deep into the listing it is.
+
+    Parameters
+    ----------
+    queryset : QuerySet
+        Must be a :class:`.Content` model (i.e. have a ``created`` field).
+        Rows without a ``created`` date can't be positioned by a cursor, and
+        are left out.
+    cursor : str
+        From a previous call, or ``None`` for the first page.
+    page_size : int
+
+    Returns
+    -------
+    tuple
+        (list of instances, cursor for the next page or ``None``)
+    """
+    queryset = queryset.exclude(created__isnull=True).order_by('-created', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created, pk = position
+        queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+
+    # Fetch one extra row to find out whether there is another page.
+    items = list(queryset[:page_size + 1])
+    if len(items) > page_size:
+        return items[:page_size], encode_cursor(items[page_size - 1])
+    return items, None
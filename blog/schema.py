@@ -1,7 +1,15 @@
 import rdflib
 from rdflib.term import URIRef
-from models import RDFSchema, RDFProperty, RDFClass
-from itertools import chain
+from rdflib.plugins.parsers.ntriples import NTriplesParser
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField, TextField
+from schema_cache import SchemaCache
+from models import (RDFSchema, RDFProperty, RDFClass, RDFClassClosure,
+                    rdf_property_index)
+from collections import defaultdict
+
+import hashlib
+import os
 
 TITLE = URIRef('http://purl.org/dc/terms/title')
 PROPERTY = URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#Property')
@@ -17,44 +25,74 @@ DOMAIN = URIRef('http://www.w3.org/2000/01/rdf-schema#domain')
 SUBPROPERTYOF = URIRef('http://www.w3.org/2000/01/rdf-schema#subPropertyOf')
 SUBCLASSOF = URIRef('http://www.w3.org/2000/01/rdf-schema#subClassOf')
 
+# Number of rows per INSERT or UPDATE statement.
+BATCH_SIZE = 500
 
-def _get_object(g, s, p):
-    """
-    Retrieve the (first) object of a relation. This is mainly to be used where
-    we expect only one relation of the specified type.
-
-    Parameters
-    ----------
-    g : rdflib.Graph
-    s : rdflib.term.URIRef
-        The subject of the relation.
-    p : rdflib.term.URIRef
-        The predicate of the relation.
 
-    Returns
-    -------
-    rdflib.term.URIRef
+class SchemaCollector(object):
     """
-
-    # objects() will return an empty iterator if the predicate is not found.
-    try:
-        return list(g.objects(s, p))[0]
-    except IndexError:
-        return None
-
-
-def _get_label(g, s):
-    """
-    Try to find the English label. Short of that, choose the first label.
+    Accumulates the handful of predicates that we care about, keyed by
+    subject. Implements the ``triple()`` sink interface used by rdflib's
+    streaming N-Triples parser, so that it can be fed either directly from a
+    stream or from an already-parsed :class:`rdflib.Graph`\.
     """
-    try:
-        for label in g.objects(s, LABEL):
-            if label.language == 'en':
+    predicates = {TYPE, LABEL, COMMENT, DESCRIPTION, DOMAIN, RANGE, SUBCLASSOF,
+                  SUBPROPERTYOF}
+
+    def __init__(self):
+        self.subjects = defaultdict(lambda: defaultdict(list))
+
+    def triple(self, s, p, o):
+        if p in self.predicates:
+            self.subjects[s][p].append(o)
+
+    def _of_type(self, *types):
+        return [s for s, attrs in self.subjects.iteritems()
+                if any(t in attrs.get(TYPE, []) for t in types)]
+
+    @property
+    def classes(self):
+        # Some schemas use the OWL Class type.
+        return self._of_type(CLASS, OWL_CLASS)
+
+    @property
+    def properties(self):
+        return self._of_type(PROPERTY)
+
+    def get_object(self, s, p):
+        """
+        Retrieve the (first) object of a relation, or ``None``.
+        """
+        objects = self.subjects.get(s, {}).get(p)
+        return objects[0] if objects else None
+
+    def get_label(self, s):
+        """
+        Try to find the English label. Short of that, choose the first label.
+        """
+        labels = self.subjects.get(s, {}).get(LABEL, [])
+        for label in labels:
+            if getattr(label, 'language', None) == 'en':
                 return label
-        return list(g.objects(s, LABEL))[0]
-    except IndexError:
+        if labels:
+            return labels[0]
         return _identifier(s)
 
+    def get_comment(self, s):
+        # We prefer to use the description, but comment is fine, too.
+        return self.get_object(s, DESCRIPTION) or self.get_object(s, COMMENT)
+
+    def graph(self):
+        """
+        The collected triples, as an :class:`rdflib.Graph`\.
+        """
+        g = rdflib.Graph()
+        for s, attrs in self.subjects.iteritems():
+            for p, objects in attrs.iteritems():
+                for o in objects:
+                    g.add((s, p, o))
+        return g
+
 
 def _identifier(uri_ref):
     """
@@ -75,107 +113,450 @@ def _identifier(uri_ref):
     return unicode(uri_ref).split(delim)[-1]
 
 
-def import_schema(schema_url, schema_name):
-    g = rdflib.Graph()
-    # Load RDF from remote location.
-    g = rdflib.Graph()
+def _parse_snapshot(path, collector):
+    with open(path, 'rb') as f:
+        NTriplesParser(sink=collector).parse(f)
+    return collector
+
+
+def load_schema(schema_url, offline=False, cache=None):
+    """
+    Collect class and property definitions from the RDF document at
+    ``schema_url`` (a URL or a local path).
+
+    Documents are cached by :class:`.SchemaCache`\. If the document hasn't
+    changed since it was last loaded, or can't be retrieved at all, we read
+    the cached N-Triples snapshot instead of parsing it again. N-Triples
+    documents are streamed line by line, without building an in-memory graph.
+    Other serializations are parsed with rdflib and then scanned once.
+
+    Parameters
+    ----------
+    schema_url : str
+    offline : bool
+        If True, use the cached snapshot (if there is one) without trying to
+        retrieve the document.
+    cache : :class:`.SchemaCache`
+
+    Returns
+    -------
+    :class:`.SchemaCollector`
+    """
+    cache = cache or SchemaCache()
+    collector = SchemaCollector()
+
+    snapshot = cache.latest(schema_url)
+    if offline and snapshot:
+        return _parse_snapshot(snapshot, collector)
+
     try:
-        g.parse(schema_url)
-    except:
-        g.parse(schema_url, format='xml')
+        path, content_hash = cache.fetch(schema_url)
+    except (IOError, ValueError):   # Unreachable; fall back to the cache.
+        if snapshot is None:
+            raise
+        return _parse_snapshot(snapshot, collector)
 
-    schema = RDFSchema(name=schema_name, uri=schema_url)
-    schema.save()
+    try:
+        snapshot = cache.snapshot_path(content_hash)
+        if os.path.exists(snapshot):    # Unchanged since it was last parsed.
+            cache.link(schema_url, content_hash)
+            return _parse_snapshot(snapshot, collector)
+
+        if schema_url.endswith('.nt'):
+            _parse_snapshot(path, collector)
+        else:
+            g = rdflib.Graph()
+            try:
+                g.parse(path, publicID=schema_url)
+            except:
+                g.parse(path, publicID=schema_url, format='xml')
+            for triple in g:
+                collector.triple(*triple)
+        cache.store(schema_url, content_hash, collector.graph())
+    finally:
+        os.remove(path)
+    return collector
+
+
+def _bulk_update(model, field, values, output_field=None):
+    """
+    Set ``field`` to ``values[pk]`` on each row, with one UPDATE per batch.
+    ``output_field`` defaults to an integer (i.e. foreign key) column.
+    """
+    pks = list(values)
+    for start in xrange(0, len(pks), BATCH_SIZE):
+        batch = pks[start:start + BATCH_SIZE]
+        expression = Case(*[When(pk=pk, then=Value(values[pk])) for pk in batch],
+                          output_field=output_field or IntegerField())
+        model.objects.filter(pk__in=batch).update(**{field: expression})
 
-    # Literal is an RDFClass, too! At least it's easier, that way.
-    defaults = {'label': u'Literal', 'partOf': schema}
-    literal_instance = RDFClass.objects.get_or_create(identifier=u'Literal',
-                                                      defaults=defaults)[0]
 
-    # Some schemas use the OWL Class type.
-    classes = chain(g.subjects(TYPE, CLASS), g.subjects(TYPE, OWL_CLASS))
-    properties = g.subjects(TYPE, PROPERTY)
+def _ensure_classes(definitions, schema):
+    """
+    Create any :class:`.RDFClass` in ``definitions`` (identifier -> field
+    values) that doesn't already exist, and return an identifier -> id map.
+    """
+    existing = dict(RDFClass.objects.filter(identifier__in=definitions.keys())
+                                    .values_list('identifier', 'id'))
+    RDFClass.objects.bulk_create([
+        RDFClass(identifier=identifier, partOf=schema, **fields)
+        for identifier, fields in definitions.iteritems()
+        if identifier not in existing
+    ], batch_size=BATCH_SIZE)
+    created = len(definitions) - len(existing)
 
-    subClass_relations, subProperty_relations = [], []
-    classesHash, propertiesHash = {}, {}
+    # bulk_create() doesn't set primary keys on every backend.
+    return dict(RDFClass.objects.filter(identifier__in=definitions.keys())
+                                .values_list('identifier', 'id')), created
 
-    # We index the Literal RDFClass so that we can retrieve it when populating
-    #  domain and range fields on RDFProperty instances.
-    classesHash[u'Literal'] = literal_instance
 
-    # Build RDFClasses first, so that we can use them in the domain and range
-    #  of RDFProperty instances.
-    for class_ref in classes:
-        identifier = _identifier(class_ref)
+class ImportResult(object):
+    """
+    Summary of an :func:`.import_schema` run.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.classes = self.classes_created = 0
+        self.properties = self.properties_created = 0
 
-        # We prefer to use the description, but comment is fine, too.
-        comment = _get_object(g, class_ref, DESCRIPTION)
-        if not comment:
-            comment = _get_object(g, class_ref, COMMENT)
-
-        kwargs = {
-            'identifier': identifier,
-            'defaults': {
-                'comment': comment,
-                'label': _get_label(g, class_ref),
-                'partOf': schema,
+
+def import_schema(schema_url, schema_name, dry_run=False, progress=None,
+                  offline=False):
+    """
+    Load the RDF vocabulary at ``schema_url`` into :class:`.RDFSchema`\,
+    :class:`.RDFClass`\, and :class:`.RDFProperty` instances.
+
+    Rows are written with ``bulk_create`` and batched UPDATEs inside a single
+    transaction, so the number of queries does not grow with the size of the
+    vocabulary. Classes and properties that already exist (by identifier)
+    keep their labels and comments, but are re-linked into the hierarchy.
+
+    Parameters
+    ----------
+    schema_url : str
+        URL or local path of the RDF document.
+    schema_name : str
+    dry_run : bool
+        If True, roll back all changes once the import is complete.
+    progress : callable
+        Called as ``progress(message)`` after each stage.
+    offline : bool
+        If True, use a cached copy of the vocabulary if one is available.
+
+    Returns
+    -------
+    :class:`.ImportResult`
+    """
+    report = progress or (lambda message: None)
+
+    collector = load_schema(schema_url, offline=offline)
+    class_refs, property_refs = collector.classes, collector.properties
+    report('Parsed %i classes and %i properties.' % (len(class_refs), len(property_refs)))
+
+    with transaction.atomic():
+        schema = RDFSchema.objects.create(name=schema_name, uri=schema_url)
+        result = ImportResult(schema)
+
+        # Literal is an RDFClass, too! At least it's easier, that way.
+        class_definitions = {u'Literal': {'label': u'Literal'}}
+        for class_ref in class_refs:
+            class_definitions[_identifier(class_ref)] = {
+                'label': collector.get_label(class_ref),
+                'comment': collector.get_comment(class_ref),
             }
-        }
-        instance, created = RDFClass.objects.get_or_create(**kwargs)
-        classesHash[identifier] = instance
 
-        # We defer filling subClassOf on the model instances until after we have
-        #  created all of the instances.
-        subClassOf = _get_object(g, class_ref, SUBCLASSOF)
-        if subClassOf:
-            subClass_relations.append((identifier, _identifier(subClassOf)))
+        # Properties may refer to classes that aren't defined in this schema;
+        #  those get a bare RDFClass.
+        for property_ref in property_refs:
+            for predicate in (DOMAIN, RANGE):
+                class_ref = collector.get_object(property_ref, predicate)
+                if class_ref is not None:
+                    class_definitions.setdefault(_identifier(class_ref), {})
+
+        class_ids, result.classes_created = _ensure_classes(class_definitions, schema)
+        result.classes = len(class_refs)
+        report('Created %i classes.' % result.classes_created)
+
+        _bulk_update(RDFClass, 'subClassOf', {
+            class_ids[_identifier(class_ref)]: class_ids.get(_identifier(parent))
+            for class_ref in class_refs
+            for parent in [collector.get_object(class_ref, SUBCLASSOF)]
+            if parent is not None
+        })
+
+        # Now generate RDFProperty instances.
+        property_definitions = {}
+        for property_ref in property_refs:
+            domain = collector.get_object(property_ref, DOMAIN)
+            range_ = collector.get_object(property_ref, RANGE)
+            property_definitions[_identifier(property_ref)] = {
+                'label': collector.get_label(property_ref),
+                'comment': collector.get_comment(property_ref),
+                'domain_id': class_ids[_identifier(domain)] if domain is not None else None,
+                'range_id': class_ids[_identifier(range_)] if range_ is not None else None,
+            }
 
-    # Fill in subClass relations on the model instances.
-    for source, target in subClass_relations:
-        classesHash[source].subClassOf = classesHash[target]
-        classesHash[source].save()
+        existing = set(RDFProperty.objects.filter(identifier__in=property_definitions.keys())
+                                          .values_list('identifier', flat=True))
+        RDFProperty.objects.bulk_create([
+            RDFProperty(identifier=identifier, partOf=schema, **fields)
+            for identifier, fields in property_definitions.iteritems()
+            if identifier not in existing
+        ], batch_size=BATCH_SIZE)
+        result.properties = len(property_refs)
+        result.properties_created = len(property_definitions) - len(existing)
+        report('Created %i properties.' % result.properties_created)
+
+        property_ids = dict(RDFProperty.objects.filter(identifier__in=property_definitions.keys())
+                                               .values_list('identifier', 'id'))
+        for field in ('domain', 'range'):
+            _bulk_update(RDFProperty, field, {
+                property_ids[identifier]: fields['%s_id' % field]
+                for identifier, fields in property_definitions.iteritems()
+                if identifier in existing
+            })
+        _bulk_update(RDFProperty, 'subPropertyOf', {
+            property_ids[_identifier(property_ref)]: property_ids.get(_identifier(parent))
+            for property_ref in property_refs
+            for parent in [collector.get_object(property_ref, SUBPROPERTYOF)]
+            if parent is not None
+        })
+
+        # Bulk operations bypass the post_save receivers that maintain the
+        #  closure, so regenerate it wholesale.
+        RDFClassClosure.objects.rebuild()
+        report('Rebuilt class hierarchy.')
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    if not dry_run:
+        rdf_property_index.build()
+    return result
+
+
+def _text(value):
+    return unicode(value) if value is not None else None
+
+
+def _identifier_or_none(uri_ref):
+    return _identifier(uri_ref) if uri_ref is not None else None
+
+
+def definition_hash(*values):
+    """
+    Digest of the values (label, comment, domain, etc) that make up a class
+    or property definition. ``None`` and empty strings are equivalent.
+    """
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update((_text(value) or u'').encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
 
-    # Now generate RDFProperty instances.
-    for property_ref in properties:
-        identifier = _identifier(property_ref)
 
-        # We prefer to use the description, but comment is fine, too.
-        comment = _get_object(g, property_ref, DESCRIPTION)
-        if not comment:
-            comment = _get_object(g, property_ref, COMMENT)
+class SchemaDiff(object):
+    """
+    Changes made (or, in a dry run, that would be made) by
+    :func:`.reimport_schema`\. Each attribute is a sorted list of
+    identifiers.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.classes_added, self.classes_modified, self.classes_removed = [], [], []
+        self.properties_added, self.properties_modified, self.properties_removed = [], [], []
 
-        kwargs = {
-            'identifier': identifier,
-            'defaults': {
-                'comment': comment,
-                'label': _get_label(g, property_ref),
-                'partOf': schema,
+    @property
+    def changed(self):
+        return bool(self.classes_added or self.classes_modified
+                    or self.properties_added or self.properties_modified)
 
-            }
-        }
-        instance, created = RDFProperty.objects.get_or_create(**kwargs)
-
-
-        instance.domain = classesHash[_identifier(_get_object(g, property_ref, DOMAIN))]
-
-        try:
-            range_ref = _get_object(g, property_ref, RANGE)
-            rclass = classesHash[_identifier(range_ref)]
-        except KeyError:
-            rclass = RDFClass.objects.get_or_create(
-                        identifier=_identifier(range_ref),
-                        defaults={'partOf': schema})[0]
-        instance.range = rclass
-        instance.save()
-        propertiesHash[identifier] = instance
-
-        # We defer filling subPropertyOf on the model instances until after we
-        #  have created all of the instances.
-        subPropertyOf = _get_object(g, class_ref, SUBPROPERTYOF)
-        if subPropertyOf:
-            subProperty_relations.append((identifier, _identifier(subPropertyOf)))
-
-    # Fill in the subPropertyOf field on RDFProperty instances.
-    for source, target in subProperty_relations:
-        propertiesHash[source].subPropertyOf = propertiesHash[target]
-        propertiesHash[source].save()
+
+def _diff(definitions, current):
+    """
+    Compare incoming ``definitions`` (identifier -> tuple of values) against
+    ``current`` rows (identifier -> (id,) + tuple of values).
+    """
+    added = sorted(set(definitions) - set(current))
+    modified = sorted(identifier for identifier, values in definitions.iteritems()
+                      if identifier in current
+                      and definition_hash(*values) != definition_hash(*current[identifier][1:]))
+    return added, modified
+
+
+def _changed_values(definitions, current, identifiers, position, transform=None):
+    """
+    Build a pk -> new value map for the field at ``position`` in each
+    definition, limited to ``identifiers`` whose value actually changed.
+    """
+    values = {}
+    for identifier in identifiers:
+        new_value = definitions[identifier][position]
+        if _text(new_value) == _text(current[identifier][position + 1]):
+            continue
+        values[current[identifier][0]] = transform(new_value) if transform else new_value
+    return values
+
+
+def _keep_unresolvable(definitions, current, position, resolvable):
+    """
+    Replace references (at ``position`` in each definition) to identifiers
+    that aren't in ``resolvable`` with the value that is currently stored.
+    We can't look those up, so they shouldn't count as a change, nor be
+    written over with NULL.
+    """
+    for identifier, values in definitions.items():
+        if values[position] is None or values[position] in resolvable:
+            continue
+        stored = current[identifier][position + 1] if identifier in current else None
+        definitions[identifier] = values[:position] + (stored,) + values[position + 1:]
+
+
+def reimport_schema(schema_url, schema_name, dry_run=False, progress=None,
+                    offline=False):
+    """
+    Bring the database in line with the RDF vocabulary at ``schema_url``\,
+    writing only the classes and properties whose definitions have changed.
+
+    Unlike :func:`.import_schema`\, this reuses the most recent
+    :class:`.RDFSchema` with the same URI (only creating one if there is
+    none), and updates labels and comments as well as the hierarchy.
+    Classes and properties that have disappeared from the vocabulary are
+    reported, but not deleted: deleting an :class:`.RDFClass` would cascade to
+    every :class:`.Entity` that instantiates it.
+
+    Parameters
+    ----------
+    schema_url : str
+        URL or local path of the RDF document.
+    schema_name : str
+        Used only if a new :class:`.RDFSchema` must be created.
+    dry_run : bool
+        If True, compute the diff and roll back all changes.
+    progress : callable
+        Called as ``progress(message)`` after each stage.
+    offline : bool
+        If True, use a cached copy of the vocabulary if one is available.
+
+    Returns
+    -------
+    :class:`.SchemaDiff`
+    """
+    report = progress or (lambda message: None)
+    collector = load_schema(schema_url, offline=offline)
+
+    # identifier -> (label, comment, subClassOf).
+    classes = {}
+    for class_ref in collector.classes:
+        classes[_identifier(class_ref)] = (
+            _text(collector.get_label(class_ref)),
+            _text(collector.get_comment(class_ref)),
+            _identifier_or_none(collector.get_object(class_ref, SUBCLASSOF)),
+        )
+
+    # identifier -> (label, comment, domain, range, subPropertyOf).
+    properties = {}
+    for property_ref in collector.properties:
+        properties[_identifier(property_ref)] = (
+            _text(collector.get_label(property_ref)),
+            _text(collector.get_comment(property_ref)),
+            _identifier_or_none(collector.get_object(property_ref, DOMAIN)),
+            _identifier_or_none(collector.get_object(property_ref, RANGE)),
+            _identifier_or_none(collector.get_object(property_ref, SUBPROPERTYOF)),
+        )
+    report('Parsed %i classes and %i properties.' % (len(classes), len(properties)))
+
+    # Classes used as a domain or range, but not defined in this vocabulary.
+    referenced = {u'Literal'} | {values[position] for values in properties.itervalues()
+                                 for position in (2, 3)
+                                 if values[position] is not None}
+    referenced -= set(classes)
+
+    with transaction.atomic():
+        schema = RDFSchema.objects.filter(uri=schema_url).order_by('-id').first()
+        if schema is None:
+            schema = RDFSchema.objects.create(name=schema_name, uri=schema_url)
+        diff = SchemaDiff(schema)
+
+        current = {row[0]: row[1:] for row in RDFClass.objects
+                   .filter(identifier__in=list(set(classes) | referenced))
+                   .values_list('identifier', 'id', 'label', 'comment',
+                                'subClassOf__identifier')}
+        _keep_unresolvable(classes, current, 2, set(classes) | referenced)
+        diff.classes_added, diff.classes_modified = _diff(classes, current)
+        diff.classes_removed = sorted(
+            set(RDFClass.objects.filter(partOf=schema).values_list('identifier', flat=True))
+            - set(classes) - referenced)
+
+        RDFClass.objects.bulk_create([
+            RDFClass(identifier=identifier, label=label, comment=comment, partOf=schema)
+            for identifier, (label, comment, _) in classes.iteritems()
+            if identifier not in current
+        ] + [
+            RDFClass(identifier=identifier, partOf=schema,
+                     label=u'Literal' if identifier == u'Literal' else None)
+            for identifier in referenced if identifier not in current
+        ], batch_size=BATCH_SIZE)
+
+        class_ids = dict(RDFClass.objects.filter(identifier__in=list(set(classes) | referenced))
+                                         .values_list('identifier', 'id'))
+        for identifier in diff.classes_added:
+            current[identifier] = (class_ids[identifier],) + classes[identifier][:2] + (None,)
+
+        changed = diff.classes_added + diff.classes_modified
+        _bulk_update(RDFClass, 'label', _changed_values(classes, current, changed, 0),
+                     output_field=TextField())
+        _bulk_update(RDFClass, 'comment', _changed_values(classes, current, changed, 1),
+                     output_field=TextField())
+        parents = _changed_values(classes, current, changed, 2, class_ids.get)
+        _bulk_update(RDFClass, 'subClassOf', parents)
+        report('Classes: %i added, %i modified, %i removed.' % (
+            len(diff.classes_added), len(diff.classes_modified), len(diff.classes_removed)))
+
+        current = {row[0]: row[1:] for row in RDFProperty.objects
+                   .filter(identifier__in=properties.keys())
+                   .values_list('identifier', 'id', 'label', 'comment',
+                                'domain__identifier', 'range__identifier',
+                                'subPropertyOf__identifier')}
+        _keep_unresolvable(properties, current, 4, set(properties))
+        diff.properties_added, diff.properties_modified = _diff(properties, current)
+        diff.properties_removed = sorted(
+            set(RDFProperty.objects.filter(partOf=schema).values_list('identifier', flat=True))
+            - set(properties))
+
+        RDFProperty.objects.bulk_create([
+            RDFProperty(identifier=identifier, label=label, comment=comment,
+                        domain_id=class_ids.get(domain), range_id=class_ids.get(range_),
+                        partOf=schema)
+            for identifier, (label, comment, domain, range_, _) in properties.iteritems()
+            if identifier not in current
+        ], batch_size=BATCH_SIZE)
+
+        property_ids = dict(RDFProperty.objects.filter(identifier__in=properties.keys())
+                                               .values_list('identifier', 'id'))
+        for identifier in diff.properties_added:
+            current[identifier] = (property_ids[identifier],) + properties[identifier][:4] + (None,)
+
+        changed = diff.properties_added + diff.properties_modified
+        _bulk_update(RDFProperty, 'label', _changed_values(properties, current, changed, 0),
+                     output_field=TextField())
+        _bulk_update(RDFProperty, 'comment', _changed_values(properties, current, changed, 1),
+                     output_field=TextField())
+        _bulk_update(RDFProperty, 'domain', _changed_values(properties, current, changed, 2, class_ids.get))
+        _bulk_update(RDFProperty, 'range', _changed_values(properties, current, changed, 3, class_ids.get))
+        _bulk_update(RDFProperty, 'subPropertyOf', _changed_values(properties, current, changed, 4, property_ids.get))
+        report('Properties: %i added, %i modified, %i removed.' % (
+            len(diff.properties_added), len(diff.properties_modified), len(diff.properties_removed)))
+
+        # Only touch the closure (and the caches built on it) if the class
+        #  hierarchy actually changed.
+        if diff.classes_added or parents:
+            RDFClassClosure.objects.rebuild()
+            report('Rebuilt class hierarchy.')
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    if diff.changed and not dry_run:
+        rdf_property_index.invalidate()
+    return diff
@@ -0,0 +1,99 @@
+from django.conf import settings
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib2
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _open(schema_url):
+    if os.path.exists(schema_url):
+        return open(schema_url, 'rb')
+    return urllib2.urlopen(schema_url)
+
+
+class SchemaCache(object):
+    """
+    On-disk cache of RDF vocabularies, used by :func:`blog.schema.load_schema`\.
+
+    Each vocabulary is stored as an N-Triples snapshot of just the triples
+    that the importer uses, named by the SHA-1 of the original document. A
+    small JSON index maps each source URL to its most recent snapshot. This
+    lets us skip parsing when a vocabulary hasn't changed, and lets imports
+    run without network access once a vocabulary has been cached.
+    """
+    def __init__(self, location=None):
+        self.location = location or getattr(settings, 'SCHEMA_CACHE_DIR', None) \
+            or os.path.join(tempfile.gettempdir(), 'genecology-schema-cache')
+
+    def _index_path(self, schema_url):
+        key = hashlib.sha1(schema_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.location, '%s.json' % key)
+
+    def snapshot_path(self, content_hash):
+        return os.path.join(self.location, '%s.nt' % content_hash)
+
+    def latest(self, schema_url):
+        """
+        Path to the most recent snapshot of ``schema_url``\, or ``None``.
+        """
+        try:
+            with open(self._index_path(schema_url)) as f:
+                content_hash = json.load(f)['content_hash']
+        except (IOError, ValueError, KeyError):
+            return None
+        path = self.snapshot_path(content_hash)
+        return path if os.path.exists(path) else None
+
+    def fetch(self, schema_url):
+        """
+        Download ``schema_url`` (a URL or local path) to a temporary file,
+        hashing it as it is read.
+
+        Returns
+        -------
+        tuple
+            (path to the temporary file, SHA-1 of its content). The caller is
+            responsible for removing the file.
+        """
+        digest = hashlib.sha1()
+        source = _open(schema_url)    # Before creating the file, in case it fails.
+        try:
+            handle, path = tempfile.mkstemp(suffix=os.path.splitext(schema_url)[1])
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                        f.write(chunk)
+            except:
+                os.remove(path)
+                raise
+        finally:
+            source.close()
+        return path, digest.hexdigest()
+
+    def store(self, schema_url, content_hash, graph):
+        """
+        Save ``graph`` as the snapshot for ``content_hash``\, and point
+        ``schema_url`` at it.
+        """
+        if not os.path.isdir(self.location):
+            os.makedirs(self.location)
+
+        # Write to temporary files and move them into place, so that
+        #  concurrent imports never see a partial snapshot.
+        handle, path = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(handle, 'wb') as f:
+            graph.serialize(destination=f, format='nt')
+        shutil.move(path, self.snapshot_path(content_hash))
+        self.link(schema_url, content_hash)
+
+    def link(self, schema_url, content_hash):
+        handle, path = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(handle, 'w') as f:
+            json.dump({'url': schema_url, 'content_hash': content_hash}, f)
+        shutil.move(path, self._index_path(schema_url))
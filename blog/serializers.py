@@ -71,6 +71,15 @@ class PostListSerializer(PostSerializer):
         exclude = ('body', '_summary_rendered', '_body_rendered', 'tags', 'published', 'body_markup_type', 'summary_markup_type')
 
 
+class NoteListSerializer(serializers.ModelSerializer):
+    creator = GenecologyUserSerializer()
+    summary = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Note
+        fields = ('id', 'title', 'slug', 'created', 'updated', 'creator', 'summary')
+
+
 class TagSerializer(serializers.ModelSerializer):
     tagged_posts = PostListSerializer(many=True, source='post_set')
 
@@ -1,11 +1,115 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
+from reversion.signals import post_revision_commit
+
 from concepts.models import Concept, Type
 from blog.models import *
+from blog.featured import invalidate_featured_images
+from blog.page_cache import bump_version
+from blog.concept_links import link_cache
+
+### Handle RDF schema signals. ###
+
+@receiver(post_save, sender=RDFClass)
+def rdfclass_update_closure(sender, **kwargs):
+    """
+    When an :class:`.RDFClass` is saved, keep the :class:`.RDFClassClosure`
+    table in step with its ``subClassOf`` relation.
+    """
+    if kwargs.get('raw', False):    # Loading fixtures.
+        return
+    RDFClassClosure.objects.refresh(kwargs.get('instance'))
+
+
+@receiver(post_save, sender=RDFClass)
+@receiver(post_delete, sender=RDFClass)
+@receiver(post_save, sender=RDFProperty)
+@receiver(post_delete, sender=RDFProperty)
+def rdf_invalidate_property_index(sender, **kwargs):
+    """
+    Changes to classes or properties may change which properties apply to
+    which classes.
+    """
+    rdf_property_index.invalidate()
+
+
+### Invalidate cached pages. ###
+
+# Changes to instances of these models are reflected in public pages.
+PAGE_CACHE_MODELS = (Post, Note, Tag, ConceptProfile, ExternalResource, Image,
+                     Data, ContentRelation, GenecologyUser, Concept,
+                     RDFProperty)
+
+
+def page_cache_bump(sender, **kwargs):
+    """
+    Invalidate cached pages that display the saved or deleted instance.
+    """
+    instance = kwargs.get('instance')
+    bump_version(sender, instance.pk)
+
+
+for model in PAGE_CACHE_MODELS:
+    post_save.connect(page_cache_bump, sender=model,
+                      dispatch_uid='page_cache_save_%s' % model.__name__)
+    post_delete.connect(page_cache_bump, sender=model,
+                        dispatch_uid='page_cache_delete_%s' % model.__name__)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Note.tags.through)
+def page_cache_bump_tags(sender, **kwargs):
+    """
+    Tagging doesn't save the tagged instance, so :func:`.page_cache_bump` won't
+    see it.
+    """
+    if kwargs.get('action') in ('post_add', 'post_remove', 'post_clear'):
+        instance = kwargs.get('instance')
+        bump_version(type(instance), instance.pk)
+        bump_version(Tag)
+
+
+@receiver(post_revision_commit)
+def page_cache_bump_revision(sender, **kwargs):
+    """
+    Pages show version history, so a new revision invalidates them even if
+    the instance itself was saved before the revision was committed.
+    """
+    for instance in kwargs.get('instances', []):
+        bump_version(type(instance), instance.pk)
+
+
+### Handle Image signals. ###
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_invalidate_featured(sender, **kwargs):
+    """
+    The list of featured images may have changed.
+    """
+    invalidate_featured_images()
+
 
 ### Handle Concept and Type signals. ###
 
+@receiver(post_save, sender=Concept)
+@receiver(post_save, sender=Type)
+def concept_invalidate_link(sender, **kwargs):
+    """
+    Links to concept profiles (in the data viewer) show the concept label.
+    """
+    link_cache.discard(kwargs.get('instance').uri)
+
+
+@receiver(post_delete, sender=ConceptProfile)
+def conceptprofile_invalidate_link(sender, **kwargs):
+    try:
+        link_cache.discard(kwargs.get('instance').concept.uri)
+    except Concept.DoesNotExist:    # Deleted along with its concept.
+        pass
+
+
 @receiver(post_save, sender=Concept)
 def concept_create_entity(sender, **kwargs):
     """
@@ -1,3 +1,873 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
 
-# Create your tests here.
+from reversion import revisions as reversion
+
+from concepts.models import Concept
+from blog.models import (RDFSchema, RDFClass, RDFClassClosure, RDFProperty,
+                         Entity, rdf_property_index, RDFPropertyIndex,
+                         GenecologyUser, Note, ExternalResource,
+                         ContentRelation, Image, Post, Tag, Data,
+                         ExternalNote, ExternalNotebook,
+                         ExternalEmbeddedResource, GenericResource)
+from blog.schema import import_schema, reimport_schema, load_schema
+from blog.schema_cache import SchemaCache
+from blog.pagination import keyset_page
+from blog.featured import random_featured_image
+from blog import page_cache
+from blog.datasets import (Dataset, get_local_path, INDEX_INTERVAL, fetch,
+                           read_metadata, write_metadata, build_index,
+                           write_index, read_index)
+from blog.history import (get_history_page, get_latest_version, get_version,
+                          get_patch_html, diff_cache)
+from blog.lru import LRUCache
+from blog.concept_links import (link_rows, create_concepts, link_cache,
+                                is_authority_uri)
+from blog.evernote_standin import StandInNoteStore, TOKEN
+from blog.evernote_api import sync_notebook, sync_note, get_note, _resource_url
+from blog.evernote_pool import NoteStorePool
+
+from evernote.edam.error.ttypes import EDAMErrorCode, EDAMUserException
+from social.apps.django_app.default.models import UserSocialAuth
+
+import datetime
+import hashlib
+import json
+import os
+import pytz
+import shutil
+import tempfile
+import threading
+import time
+import BaseHTTPServer
+
+CIDOC_CRM = os.path.join(os.path.dirname(__file__), 'static', 'rdfs',
+                         'cidoc_crm_v6.2.1-draft-b-2015October.rdfs')
+
+# A vocabulary that migrations don't load (N-Triples, so that it is streamed).
+EXAMPLE_VOCABULARY = '''\
+<http://example.com/vocab#X1_Thing> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class> .
+<http://example.com/vocab#X1_Thing> <http://www.w3.org/2000/01/rdf-schema#label> "Thing"@en .
+<http://example.com/vocab#X2_Part> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class> .
+<http://example.com/vocab#X2_Part> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://example.com/vocab#X1_Thing> .
+<http://example.com/vocab#XP1_has_part> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property> .
+<http://example.com/vocab#XP1_has_part> <http://www.w3.org/2000/01/rdf-schema#domain> <http://example.com/vocab#X1_Thing> .
+<http://example.com/vocab#XP1_has_part> <http://www.w3.org/2000/01/rdf-schema#range> <http://example.com/vocab#X2_Part> .
+'''
+
+TEST_SCHEMA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'genecology-test-schema-cache')
+TEST_DATA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'genecology-test-data-cache')
+TEST_MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'genecology-test-media')
+
+
+def write_vocabulary(test, content):
+    location = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, location)
+    path = os.path.join(location, 'example.nt')
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+class TestRDFClassClosure(TestCase):
+    def setUp(self):
+        self.schema = RDFSchema.objects.create(name='Test')
+        self.root = RDFClass.objects.create(identifier='E1', partOf=self.schema)
+        self.middle = RDFClass.objects.create(identifier='E2', partOf=self.schema,
+                                              subClassOf=self.root)
+        self.leaf = RDFClass.objects.create(identifier='E3', partOf=self.schema,
+                                            subClassOf=self.middle)
+        self.other = RDFClass.objects.create(identifier='E4', partOf=self.schema)
+
+    def test_children_and_parents(self):
+        self.assertEqual(set(self.root.children),
+                         {self.root, self.middle, self.leaf})
+        self.assertEqual(set(self.leaf.parents),
+                         {self.root, self.middle, self.leaf})
+
+    def test_is_a(self):
+        entity = Entity.objects.create(label='Thing', instance_of=self.leaf)
+        self.assertTrue(entity.is_a(self.root))
+        self.assertFalse(entity.is_a(self.other))
+
+    def test_children_instances(self):
+        leaf_entity = Entity.objects.create(label='Leaf', instance_of=self.leaf)
+        Entity.objects.create(label='Other', instance_of=self.other)
+        with self.assertNumQueries(1):
+            instances = list(self.middle.children_instances)
+        self.assertEqual(instances, [leaf_entity])
+
+    def test_move_subtree(self):
+        self.middle.subClassOf = self.other
+        self.middle.save()
+        self.assertEqual(set(self.leaf.parents),
+                         {self.other, self.middle, self.leaf})
+        self.assertEqual(set(self.root.children), {self.root})
+
+    def test_rebuild(self):
+        RDFClassClosure.objects.all().delete()
+        RDFClassClosure.objects.rebuild()
+        depth = RDFClassClosure.objects.get(ancestor=self.root,
+                                            descendant=self.leaf).depth
+        self.assertEqual(depth, 2)
+
+    def test_migrated_vocabulary(self):
+        # Migrations load CIDOC CRM, so tests share the database with it.
+        entity = RDFClass.objects.get(identifier='E1_CRM_Entity')
+        self.assertIn(RDFClass.objects.get(identifier='E5_Event'), entity.children)
+        self.assertTrue(RDFProperty.objects.filter(identifier='P106i_forms_part_of').exists())
+        self.assertIn(self.root, self.root.children)    # Alongside our own.
+
+
+class TestRDFPropertyIndex(TestCase):
+    def setUp(self):
+        schema = RDFSchema.objects.create(name='Test')
+        self.actor = RDFClass.objects.create(identifier='E39', partOf=schema)
+        self.person = RDFClass.objects.create(identifier='E21', partOf=schema,
+                                              subClassOf=self.actor)
+        self.place = RDFClass.objects.create(identifier='E53', partOf=schema)
+        self.prop = RDFProperty.objects.create(identifier='P74', partOf=schema,
+                                               domain=self.actor,
+                                               range=self.place)
+
+    def test_available_properties(self):
+        self.assertEqual(list(self.person.available_properties), [self.prop])
+        self.assertEqual(list(self.place.available_properties), [])
+
+    def test_domain_and_range(self):
+        rdf_property_index.build()
+        with self.assertNumQueries(3):    # Just the version, each time.
+            self.assertTrue(rdf_property_index.in_domain(self.prop.id, self.person.id))
+            self.assertFalse(rdf_property_index.in_domain(self.prop.id, self.place.id))
+            self.assertTrue(rdf_property_index.in_range(self.prop.id, self.place.id))
+
+    def test_invalidated_on_save(self):
+        self.place.subClassOf = self.actor
+        self.place.save()
+        self.assertTrue(rdf_property_index.in_domain(self.prop.id, self.place.id))
+
+    def test_invalidated_elsewhere(self):
+        rdf_property_index.build()
+        other = RDFPropertyIndex()    # Another process.
+        other.build()
+        self.place.subClassOf = self.actor
+        self.place.save()
+        self.assertTrue(other.in_domain(self.prop.id, self.place.id))
+
+
+@override_settings(SCHEMA_CACHE_DIR=TEST_SCHEMA_CACHE_DIR)
+class TestImportSchema(TestCase):
+    def test_import_cidoc_crm(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = import_schema(CIDOC_CRM, 'CIDOC-CRM')
+
+        # The number of queries should not depend on the size of the schema.
+        self.assertLess(len(queries), 40)
+        self.assertGreater(result.classes, 80)
+        self.assertGreater(result.properties, 250)
+
+        event = RDFClass.objects.get(identifier='E5_Event')
+        self.assertIn(RDFClass.objects.get(identifier='E7_Activity'), event.children)
+        self.assertIn(RDFClass.objects.get(identifier='E1_CRM_Entity'), event.parents)
+        self.assertTrue(RDFProperty.objects.get(identifier='P4_has_time-span').domain_id)
+
+    def _counts(self):
+        return [model.objects.count() for model in (RDFSchema, RDFClass, RDFProperty)]
+
+    def test_dry_run(self):
+        source = write_vocabulary(self, EXAMPLE_VOCABULARY)
+        before = self._counts()
+        result = import_schema(source, 'Example', dry_run=True)
+        self.assertEqual((result.classes_created, result.properties_created), (2, 1))
+        self.assertEqual(self._counts(), before)
+        self.assertFalse(RDFClass.objects.filter(identifier='X1_Thing').exists())
+
+
+@override_settings(SCHEMA_CACHE_DIR=TEST_SCHEMA_CACHE_DIR)
+class TestReimportSchema(TestCase):
+    def setUp(self):
+        import_schema(CIDOC_CRM, 'CIDOC-CRM')
+
+    def test_unchanged(self):
+        schemas = RDFSchema.objects.count()
+        diff = reimport_schema(CIDOC_CRM, 'CIDOC-CRM')
+        self.assertFalse(diff.changed)
+        self.assertEqual(RDFSchema.objects.count(), schemas)
+        self.assertEqual(diff.schema, RDFSchema.objects.get(uri=CIDOC_CRM))
+
+    def test_modified(self):
+        RDFClass.objects.filter(identifier='E5_Event').update(label='Changed')
+        RDFProperty.objects.filter(identifier='P4_has_time-span').update(range=None)
+        RDFClass.objects.create(identifier='X1_Obsolete',
+                                partOf=RDFSchema.objects.get(uri=CIDOC_CRM))
+
+        diff = reimport_schema(CIDOC_CRM, 'CIDOC-CRM')
+        self.assertEqual(diff.classes_modified, ['E5_Event'])
+        self.assertEqual(diff.properties_modified, ['P4_has_time-span'])
+        self.assertEqual(diff.classes_removed, ['X1_Obsolete'])
+        self.assertEqual(RDFClass.objects.get(identifier='E5_Event').label, 'Event')
+        self.assertEqual(RDFProperty.objects.get(identifier='P4_has_time-span').range.identifier,
+                         'E52_Time-Span')
+
+    def test_undefined_parent(self):
+        source = write_vocabulary(self, EXAMPLE_VOCABULARY +
+            '<http://example.com/vocab#X3_Orphan> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+            '<http://www.w3.org/2000/01/rdf-schema#Class> .\n'
+            '<http://example.com/vocab#X3_Orphan> <http://www.w3.org/2000/01/rdf-schema#subClassOf> '
+            '<http://example.com/elsewhere#Y1_Elsewhere> .\n')
+        reimport_schema(source, 'Example')
+        self.assertIsNone(RDFClass.objects.get(identifier='X3_Orphan').subClassOf)
+
+        # Parents that the vocabulary can't resolve are left as they are.
+        thing = RDFClass.objects.get(identifier='X1_Thing')
+        RDFClass.objects.filter(identifier='X3_Orphan').update(subClassOf=thing)
+        self.assertFalse(reimport_schema(source, 'Example').changed)
+        self.assertEqual(RDFClass.objects.get(identifier='X3_Orphan').subClassOf, thing)
+
+
+class TestSchemaCache(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.cache = SchemaCache(self.location)
+
+    def test_snapshot_reused(self):
+        first = load_schema(CIDOC_CRM, cache=self.cache)
+        self.assertIsNotNone(self.cache.latest(CIDOC_CRM))
+
+        second = load_schema(CIDOC_CRM, cache=self.cache)
+        self.assertEqual(set(first.classes), set(second.classes))
+        self.assertEqual(set(first.properties), set(second.properties))
+
+    def test_unreachable(self):
+        source = os.path.join(self.location, 'crm.rdfs')
+        shutil.copy(CIDOC_CRM, source)
+        first = load_schema(source, cache=self.cache)
+        os.remove(source)
+
+        second = load_schema(source, cache=self.cache)
+        self.assertEqual(set(first.classes), set(second.classes))
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+
+class TestContentRelationLoading(TestCase):
+    def setUp(self):
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.note = Note.objects.create(title='Note', content='Content',
+                                        creator=self.user)
+
+    def _relate(self, count):
+        for i in xrange(count):
+            resource = ExternalResource.objects.create(
+                name='Resource %i' % i, source='Web', identifier='r%i' % i,
+                identifier_type='other', description='', creator=self.user)
+            other = Note.objects.create(title='Other %i' % i, content='',
+                                        creator=self.user)
+            ContentRelation.objects.create(source=self.note, target=resource)
+            ContentRelation.objects.create(source=other, target=self.note)
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            for relation in ContentRelation.objects.from_objects(self.note).with_related():
+                relation.target, relation.instance_of
+            for relation in ContentRelation.objects.to_objects(self.note).with_related():
+                relation.source, relation.instance_of
+        return len(queries)
+
+    def test_constant_queries(self):
+        self._relate(1)
+        few = self._count_queries()
+        self._relate(10)
+        self.assertEqual(self._count_queries(), few)
+
+
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        created = datetime.datetime(2016, 1, 1, tzinfo=pytz.UTC)
+        for i in xrange(7):
+            # Pairs of notes share a timestamp, to exercise the id tiebreaker.
+            Note.objects.create(title='Note %i' % i, content='', creator=user,
+                                created=created + datetime.timedelta(days=i // 2))
+
+    def test_pages(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Note.objects.all(), cursor, page_size=3)
+            seen += page
+            if cursor is None:
+                break
+        expected = list(Note.objects.order_by('-created', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursor(self):
+        page, _ = keyset_page(Note.objects.all(), 'garbage', page_size=3)
+        self.assertEqual(len(page), 3)
+
+    def test_null_created(self):
+        note = Note.objects.create(title='Undated', content='',
+                                   creator=Note.objects.first().creator)
+        Note.objects.filter(pk=note.pk).update(created=None)    # save() sets it.
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Note.objects.all(), cursor, page_size=3)
+            seen += page
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertNotIn('Undated', [note.title for note in seen])
+
+
+class TestFeaturedImage(TestCase):
+    def setUp(self):
+        user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.image = Image.objects.create(name='Image', source='Test',
+                                          identifier='image', identifier_type='other',
+                                          description='', original_format='image/png',
+                                          creator=user, feature=True)
+
+    def test_cached_ids(self):
+        self.assertEqual(random_featured_image(), self.image)
+        with self.assertNumQueries(1):  # Primary key lookup only.
+            self.assertEqual(random_featured_image(), self.image)
+
+    def test_invalidated_on_save(self):
+        random_featured_image()
+        self.image.feature = False
+        self.image.save()
+        self.assertIsNone(random_featured_image())
+
+
+class TestTagCounts(TestCase):
+    def setUp(self):
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+
+    def _tag(self, i):
+        tag = Tag.objects.create(slug='tag-%i' % i, title='Tag %i' % i)
+        for j in xrange(3):
+            post = Post.objects.create(title='Post', summary='', body='',
+                                       published=j > 0, creator=self.user)
+            note = Note.objects.create(title='Note', content='', creator=self.user)
+            post.tags.add(tag)
+            note.tags.add(tag)
+        return tag
+
+    def test_counts(self):
+        tag = self._tag(0)
+        tags = Tag.objects.with_counts(recent=1)
+        self.assertEqual((tags[0].post_count, tags[0].note_count), (2, 3))
+        self.assertEqual(tags[0].num_posts(), tag.num_posts())
+        self.assertEqual(len(tags[0].recent_notes), 1)
+
+    def test_constant_queries(self):
+        self._tag(0)
+        with CaptureQueriesContext(connection) as few:
+            Tag.objects.with_counts()
+        for i in xrange(1, 5):
+            self._tag(i)
+        with CaptureQueriesContext(connection) as many:
+            Tag.objects.with_counts()
+        self.assertEqual(len(few), len(many))
+
+    def test_recent(self):
+        tags = [self._tag(i) for i in xrange(4)]
+        Tag.objects.create(slug='empty', title='Empty')
+        # Tags and counts, and then ids and items for each model.
+        with self.assertNumQueries(7):
+            by_slug = {t.slug: t for t in Tag.objects.with_counts(recent=2)}
+        for tag in tags:
+            newest = tag.post_set.filter(published=True).order_by('-created', '-id')[:2]
+            self.assertEqual(by_slug[tag.slug].recent_posts, list(newest))
+            newest = tag.note_set.order_by('-created', '-id')[:2]
+            self.assertEqual(by_slug[tag.slug].recent_notes, list(newest))
+        self.assertEqual(by_slug['empty'].recent_notes, [])
+
+        for i in xrange(4, 8):
+            self._tag(i)
+        with self.assertNumQueries(7):
+            Tag.objects.with_counts(recent=2)
+
+
+class TestPageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.post = Post.objects.create(title='First title', summary='', body='',
+                                        published=True, creator=user)
+
+    def test_anonymous_hit(self):
+        first = self.client.get(reverse('blog'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('blog'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_invalidated_on_save(self):
+        self.assertContains(self.client.get(reverse('blog')), 'First title')
+        self.post.title = 'Second title'
+        self.post.save()
+        self.assertContains(self.client.get(reverse('blog')), 'Second title')
+
+    def test_session_bypasses_cache(self):
+        self.client.get(reverse('blog'))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'session'
+        self.client.get(reverse('blog'))
+        self.assertEqual(page_cache.stats(), {'hits': 0, 'misses': 1})
+
+    def test_headers(self):
+        @page_cache.cache_public_page()
+        def view(request):
+            response = HttpResponse('a,b', content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="data.csv"'
+            response['Vary'] = 'Accept-Language'
+            return response
+
+        request = RequestFactory().get('/data.csv')
+        first = view(request)
+        second = view(request)
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1})
+        self.assertEqual(sorted(second.items()), sorted(first.items()))
+        self.assertEqual(second['Content-Type'], 'text/csv')
+
+
+class TestHistory(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.post = Post.objects.create(title='Post', summary='', body='',
+                                        published=True, creator=self.user)
+        for i in xrange(25):
+            with reversion.create_revision():
+                self.post.body = 'Revision %i' % i
+                self.post.save()
+                reversion.set_user(self.user)
+                reversion.set_comment('Revision %i' % i)
+
+    def test_latest(self):
+        with self.assertNumQueries(1):
+            latest = get_latest_version(self.post)
+            self.assertEqual(latest.revision.comment, 'Revision 24')
+            self.assertEqual(latest.revision.user, self.user)
+
+    def test_pages(self):
+        with self.assertNumQueries(1):
+            versions, has_next = get_history_page(self.post, 2, page_size=10)
+            self.assertEqual([version['user'] for version in versions],
+                             [self.user] * 10)
+        self.assertTrue(has_next)
+        versions, has_next = get_history_page(self.post, 3, page_size=10)
+        self.assertEqual(len(versions), 5)
+        self.assertFalse(has_next)
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('history_rest_list',
+                                           args=('post', self.post.id)))
+        data = json.loads(response.content)
+        self.assertEqual(data['results'][0]['comment'], 'Revision 24')
+        self.assertEqual(data['results'][0]['user'], 'test')
+        self.assertTrue(data['has_next'])
+
+    def test_cached_diff(self):
+        diff_cache.clear()
+        latest = get_latest_version(self.post)
+        version = get_version(self.post, latest.revision_id - 3)
+        patch = get_patch_html(version, latest, 'body')
+        self.assertIn('Revision', patch)
+        self.assertEqual(len(diff_cache), 1)
+        self.assertEqual(get_patch_html(version, latest, 'body'), patch)
+        self.assertEqual(len(diff_cache), 1)
+
+
+class TestLRUCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+
+
+@override_settings(DATA_CACHE_DIR=TEST_DATA_CACHE_DIR)
+class TestDataset(TestCase):
+    location = 'http://example.com/data.csv'
+
+    def setUp(self):
+        cache.clear()
+        path = get_local_path(self.location)
+        if not os.path.isdir(TEST_DATA_CACHE_DIR):
+            os.makedirs(TEST_DATA_CACHE_DIR)
+        with open(path, 'wb') as f:    # Stands in for the downloaded copy.
+            f.write('id,value\n')
+            for i in xrange(INDEX_INTERVAL * 3 + 5):
+                if i % 7:
+                    f.write('%i,value %i\n' % (i, i))
+                else:    # Quoted cells may span lines.
+                    f.write('%i,"multi\nline %i"\n' % (i, i))
+        write_metadata(path, {'validated': time.time()})
+
+        user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.data = Data.objects.create(name='Data', source='Test',
+                                        identifier='data', identifier_type='other',
+                                        description='', data_format='csv',
+                                        location=self.location, creator=user)
+
+    def tearDown(self):
+        shutil.rmtree(TEST_DATA_CACHE_DIR, ignore_errors=True)
+
+    def test_index(self):
+        dataset = Dataset(self.data)
+        self.assertEqual(dataset.header, ['id', 'value'])
+        self.assertEqual(dataset.count, INDEX_INTERVAL * 3 + 5)
+
+    def test_rows(self):
+        dataset = Dataset(self.data)
+        for offset in (0, 1, INDEX_INTERVAL - 1, INDEX_INTERVAL, 2 * INDEX_INTERVAL + 7):
+            rows = list(dataset.rows(offset, 3))
+            self.assertEqual(rows[0][0], unicode(offset))
+            self.assertEqual(len(rows), 3)
+        self.assertEqual(list(dataset.rows(7, 1)), [['7', 'multi\nline 7']])
+        self.assertEqual(len(list(dataset.rows(dataset.count - 2, 10))), 2)
+        self.assertEqual(list(dataset.rows(dataset.count, 10)), [])
+
+    def test_rows_endpoint(self):
+        response = self.client.get(reverse('datum_rows', args=(self.data.id,)),
+                                   {'offset': 10, 'limit': 2})
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['offset'], 10)
+        self.assertEqual(data['rows'], [['10', 'value 10'], ['11', 'value 11']])
+
+
+class CSVHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves a small CSV file, honouring ``If-None-Match``\.
+    """
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.getheader('If-None-Match'))
+        if self.headers.getheader('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write('id,value\n1,one\n2,two\n')
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(DATA_CACHE_DIR=TEST_DATA_CACHE_DIR, DATA_CACHE_TIMEOUT=0)
+class TestDataCache(TestCase):
+    def setUp(self):
+        CSVHandler.requests = []
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), CSVHandler)
+        self.location = 'http://127.0.0.1:%i/data.csv' % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(TEST_DATA_CACHE_DIR, ignore_errors=True)
+
+    def test_revalidation(self):
+        path = fetch(self.location)
+        self.assertEqual(read_metadata(path)['etag'], '"v1"')
+        self.assertEqual(read_index(path)['count'], 2)
+        modified = os.path.getmtime(path)
+
+        self.assertEqual(fetch(self.location), path)
+        self.assertEqual(CSVHandler.requests, [None, '"v1"'])
+        self.assertEqual(os.path.getmtime(path), modified)
+
+    def test_stale_fallback(self):
+        path = fetch(self.location)
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertEqual(fetch(self.location), path)
+        self.assertEqual(build_index(path)['count'], 2)
+
+    @override_settings(DATA_CACHE_TIMEOUT=3600)
+    def test_fresh(self):
+        fetch(self.location)
+        fetch(self.location)
+        self.assertEqual(len(CSVHandler.requests), 1)
+
+    def test_index_signature(self):
+        path = fetch(self.location)
+        with open(path, 'ab') as f:
+            f.write('3,three\n')
+        self.assertIsNone(read_index(path))
+        write_index(path, build_index(path))
+        self.assertEqual(read_index(path)['count'], 3)
+
+
+class TestConceptLinks(TestCase):
+    uri = 'http://www.digitalhps.org/concepts/CON1'
+
+    def setUp(self):
+        link_cache.clear()
+        GenecologyUser.objects.create_user('test', 'test@example.com')
+        # E1_CRM_Entity, for new concepts' entities, comes from migrations.
+
+    def test_is_authority_uri(self):
+        self.assertTrue(is_authority_uri(self.uri))
+        self.assertFalse(is_authority_uri('http://example.com/concepts/CON1'))
+        self.assertFalse(is_authority_uri('CON1'))
+
+    def test_no_writes(self):
+        rows = [['a', self.uri], [self.uri, 'b']]
+        with self.assertNumQueries(1):
+            self.assertEqual(link_rows(rows), rows)    # No profile yet.
+        self.assertFalse(Concept.objects.exists())
+
+    def test_batch(self):
+        other = self.uri + '2'
+        self.assertEqual(len(create_concepts([self.uri, other])), 2)
+        self.assertEqual(create_concepts([self.uri]), [])
+        rows = [['a', self.uri], [other, self.uri]]
+        with self.assertNumQueries(1):
+            linked = link_rows(rows)
+        self.assertIn('label-success', linked[1][0])
+        self.assertEqual(linked[0][1], linked[1][1])
+        with self.assertNumQueries(0):    # Memoized.
+            self.assertEqual(link_rows(rows), linked)
+
+
+class TestNotebookSync(TestCase):
+    def setUp(self):
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.store = StandInNoteStore()
+        self.notebook_id = self.store.add_notebook('Notebook')
+        self.other_id = self.store.add_notebook('Other')
+        self.guids = [self.store.add_note(self.notebook_id, 'Note %i' % i, 'Content')
+                      for i in xrange(5)]
+        self.store.add_note(self.other_id, 'Elsewhere')
+        self.notebook = ExternalNotebook.objects.create(
+            external_id=self.notebook_id,
+            external_source=ExternalNotebook.EVERNOTE,
+            belongs_to=self.user)
+
+    def sync(self):
+        self.store.calls.clear()
+        return sync_notebook(self.user, self.notebook, chunk_size=2,
+                             store=(self.store, TOKEN))
+
+    def test_initial_sync(self):
+        self.assertEqual(self.sync(), {'updated': 5, 'removed': 0})
+        self.assertEqual(self.store.calls['getNote'], 5)
+        self.assertEqual(self.notebook.notes.count(), 5)
+        self.assertEqual(self.notebook.update_sequence_number,
+                         self.store.update_count)
+
+    def test_refresh(self):
+        self.sync()
+        self.store.update_note(self.guids[0], content='Changed')
+        self.assertEqual(self.sync(), {'updated': 1, 'removed': 0})
+        self.assertEqual(self.store.calls['getNote'], 1)
+        note = ExternalNote.objects.get(external_id=self.guids[0]).local_note
+        self.assertEqual(note.content.raw, 'Changed')
+
+        self.assertEqual(self.sync(), {'updated': 0, 'removed': 0})
+        self.assertEqual(self.store.calls['getNote'], 0)
+        self.assertEqual(self.store.calls['getFilteredSyncChunk'], 0)
+
+    def test_removed(self):
+        self.sync()
+        self.store.delete_note(self.guids[0])
+        self.store.expunge_note(self.guids[1])
+        self.store.update_note(self.guids[2], notebook_guid=self.other_id)
+        self.assertEqual(self.sync(), {'updated': 0, 'removed': 3})
+        self.assertEqual(self.notebook.notes.count(), 2)
+        self.assertTrue(Note.objects.filter(title='Note 0').exists())
+
+
+class TestTagCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.store = StandInNoteStore()
+        self.notebook_id = self.store.add_notebook('Notebook')
+        self.tag_ids = [self.store.add_tag('tag%i' % i) for i in xrange(3)]
+
+    def get_note(self, tag_ids):
+        note_id = self.store.add_note(self.notebook_id, 'Note', tag_guids=tag_ids)
+        return get_note(self.user, note_id, store=(self.store, TOKEN))
+
+    def test_one_listing(self):
+        self.assertEqual([tag['label'] for tag in self.get_note(self.tag_ids)['tags']],
+                         ['tag0', 'tag1', 'tag2'])
+        self.get_note(self.tag_ids[:2])
+        self.assertEqual(self.store.calls['listTags'], 1)
+        self.assertEqual(self.store.calls['getTag'], 0)
+
+    def test_refresh_on_miss(self):
+        self.get_note(self.tag_ids)
+        new_id = self.store.add_tag('new')
+        self.assertEqual(self.get_note([new_id])['tags'],
+                         [{'id': new_id, 'label': 'new'}])
+        self.assertEqual(self.store.calls['listTags'], 2)
+
+
+class StandInPool(NoteStorePool):
+    def _create(self, token):
+        self.created += 1
+        return StandInNoteStore(), token
+
+
+class TestNoteStorePool(TestCase):
+    def setUp(self):
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        self.auth = UserSocialAuth.objects.create(
+            user=self.user, provider='evernote', uid='1',
+            extra_data={'oauth_token': 'S=s1:U=1:E=%x:C=1:P=1:A=test:V=2:H=1' % (
+                int(time.time() + 3600) * 1000)})
+        self.pool = StandInPool()
+
+    def set_token(self, token):
+        self.auth.extra_data = {'oauth_token': token}
+        self.auth.save()
+
+    def test_reuse(self):
+        with self.pool.checkout(self.user) as store:
+            pass
+        with self.pool.checkout(self.user) as again:
+            self.assertIs(again, store)
+        self.assertEqual(self.pool.created, 1)
+
+    def test_concurrent(self):
+        with self.pool.checkout(self.user) as store:
+            with self.pool.checkout(self.user) as other:
+                self.assertIsNot(other, store)
+        self.assertEqual(self.pool.created, 2)
+        self.assertEqual(len(self.pool.idle[self.user.id]), 2)
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            with self.pool.checkout(self.user):
+                raise ValueError()
+        self.assertFalse(self.pool.idle.get(self.user.id))
+
+    def test_auth_error(self):
+        with self.pool.checkout(self.user) as store:
+            pass
+        self.set_token('S=s1:U=1:C=1:P=1:A=test:V=2:H=2')
+        with self.pool.checkout(self.user) as (_, token):
+            self.assertNotIn('H=2', token)    # Still the token in use.
+
+        with self.assertRaises(EDAMUserException):
+            with self.pool.checkout(self.user) as again:
+                self.assertIs(again, store)
+                raise EDAMUserException(errorCode=EDAMErrorCode.AUTH_EXPIRED)
+        self.assertFalse(self.pool.idle.get(self.user.id))
+        with self.pool.checkout(self.user) as (_, token):
+            self.assertIn('H=2', token)
+        self.assertEqual(self.pool.created, 2)
+
+    def test_expired(self):
+        self.set_token('S=s1:U=1:E=%x:C=1:P=1:A=test:V=2:H=1' % 1000)
+        with self.pool.checkout(self.user):
+            pass
+        self.set_token('S=s1:U=1:C=1:P=1:A=test:V=2:H=2')
+        with self.pool.checkout(self.user) as (_, token):
+            self.assertIn('H=2', token)
+        self.assertEqual(self.pool.created, 2)
+
+
+@override_settings(DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+                   MEDIA_ROOT=TEST_MEDIA_ROOT)
+class TestResourceIngestion(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = GenecologyUser.objects.create_user('test', 'test@example.com')
+        # Resources are related to their notes by P106i_forms_part_of, which
+        #  migrations load.
+        self.store = StandInNoteStore()
+        self.notebook_id = self.store.add_notebook('Notebook')
+        self.service = override_settings(EVERNOTE_SERVICE_URL=self.store.serve())
+        self.service.enable()
+
+    def tearDown(self):
+        self.service.disable()
+        self.store.stop()
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+    def sync(self, resources):
+        note_id = self.store.add_note(self.notebook_id, 'Note', resources=resources)
+        return sync_note(self.user, note_id, store=(self.store, TOKEN))
+
+    def test_stored(self):
+        self.sync([('image/png', 'png body', 'Figure.PNG'),
+                   ('application/pdf', 'pdf body', None)])
+        name = Image.objects.get().image.name
+        self.assertEqual(name, 'evernote/%s.png' % hashlib.md5('png body').hexdigest())
+        self.assertEqual(default_storage.open(name).read(), 'png body')
+        name = GenericResource.objects.get().file_obj.name
+        self.assertEqual(name, 'evernote/%s.pdf' % hashlib.md5('pdf body').hexdigest())
+        self.assertEqual(self.store.calls['download'], 2)
+        relation = ContentRelation.objects.from_objects(Image.objects.get()).get()
+        self.assertEqual(relation.instance_of.identifier, 'P106i_forms_part_of')
+
+    def test_deduplicated(self):
+        self.sync([('image/png', 'shared', 'a.png')])
+        other = GenecologyUser.objects.create_user('other', 'other@example.com')
+        note_id = self.store.add_note(self.notebook_id, 'Note', resources=[
+            ('image/png', 'shared', 'b.png')])
+        sync_note(other, note_id, store=(self.store, TOKEN))
+
+        # Each user gets their own Image, but the body is stored once.
+        images = Image.objects.order_by('id')
+        self.assertEqual([image.creator for image in images], [self.user, other])
+        self.assertEqual(images[0].image.name, images[1].image.name)
+        self.assertEqual(self.store.calls['download'], 1)
+
+    def test_resource_url(self):
+        with self.assertRaises(ValueError):
+            _resource_url('U=1:A=no-shard', 'guid')
+        self.assertTrue(_resource_url(TOKEN, 'guid').endswith('/shard/s1/res/guid'))
+        with override_settings(EVERNOTE_SERVICE_URL=None):
+            self.assertEqual(_resource_url(TOKEN, 'guid'),
+                             'https://www.evernote.com/shard/s1/res/guid')
+            self.assertEqual(NoteStorePool(sandbox=True).service_url,
+                             'https://sandbox.evernote.com')
+
+    def test_concurrent(self):
+        self.store.delay = 0.1
+        self.sync([('image/png', 'body %i' % i, None) for i in xrange(4)] +
+                  [('image/png', 'body 0', None)])
+        self.assertEqual(self.store.calls['download'], 4)
+        self.assertGreater(self.store.max_downloads, 1)
+        self.assertEqual(Image.objects.count(), 5)
+        self.assertEqual(len(set(Image.objects.values_list('image', flat=True))), 4)
+        self.assertEqual(ContentRelation.objects.filter(
+            instance_of__identifier='P106i_forms_part_of').count(), 5)
+
+    def test_deleted_duplicate(self):
+        self.sync([('image/png', 'shared', 'a.png')])
+        Image.objects.all().delete()    # The stored body stays.
+        self.sync([('image/png', 'shared', 'b.png')])
+        self.assertEqual(Image.objects.count(), 1)
+        self.assertEqual(self.store.calls['download'], 1)
+
+    def test_failed_transfer(self):
+        note_id = self.store.add_note(self.notebook_id, 'Note', resources=[
+            ('image/png', 'body %i' % i, None) for i in xrange(3)])
+        resource = self.store.notes[note_id].resources[1]
+        del self.store.bodies[resource.guid]
+        with self.assertRaises(IOError):    # requests' HTTPError.
+            sync_note(self.user, note_id, store=(self.store, TOKEN))
+        self.assertFalse(Image.objects.exists())
@@ -1,6 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django import forms
-from django.http import HttpResponse, HttpResponseNotFound, HttpResponseRedirect
+from django.http import (HttpResponse, HttpResponseNotFound,
+                         HttpResponseRedirect, StreamingHttpResponse)
 from django.conf import settings
 from django.utils.safestring import mark_safe
 from django.core.validators import URLValidator
@@ -22,159 +23,216 @@ from haystack.generic_views import SearchView
 from haystack.query import EmptySearchQuerySet, SearchQuerySet
 from haystack.forms import SearchForm
 
-from reversion.helpers import generate_patch_html
-
 from models import *
 from blog.serializers import *
 from concepts.authorities import get_namespace, get_by_namespace
 
-import urllib2 as urllib
-import csv
 import datetime
+import itertools
+import json as jsonlib
 
 from blog import evernote_api, tasks
+from blog.pagination import keyset_page
+from blog.datasets import Dataset, ROWS_PER_PAGE, MAX_ROWS
+from blog.concept_links import link_rows
+from blog.history import (get_latest_version, get_version, get_history_page,
+                          summarize_version, get_patch_html)
+from blog.featured import random_featured_image
+from blog.page_cache import cache_public_page, page_version
+from blog import page_cache
+
+
+# Models whose titles and descriptions appear in the related content panel.
+RELATED_CONTENT = (ContentRelation, RDFProperty, Post, Note, ExternalResource,
+                   ConceptProfile, Image, Data)
 
 
 ## Helper functions start here.
 
-def validate_url(value):
+def get_default_context():
     """
-    Evaluate whether a string is a URL.
+    Generate context used in most/all views.
     """
-    try:
-        URLValidator()(value)
-        return True
-    except ValidationError:
-        return False
+    return {'form': PostSearchForm}
 
 
-def detect_uri(cell):
+def get_history_context(obj, typed, latest):
     """
-    Convert URIs to labeled links to :class:`.ConceptProfile` view.
-
-    Will create new :class:`.Concept` and :class:`.ConceptProfile` instances
-    if a matching authority is found.
+    Generate context for the ``history_modal.html`` template fragment. Only
+    the latest version is rendered with the page; the full history is loaded
+    from :func:`.history` when the modal is opened.
     """
-    if validate_url(cell):
-        namespace = get_namespace(cell)
-        managers = get_by_namespace(namespace)
-        if len(managers) > 0:
-            concept = Concept.objects.get_or_create(uri=cell, authority=managers[0].__name__)[0]
-            conceptprofile = ConceptProfile.objects.get_or_create(concept=concept, defaults={'creator_id': 1, 'summary': 'Pending', 'description': 'Pending'})[0]
-            cpurl = reverse('conceptprofile', args=(conceptprofile.id,))
-            cell = mark_safe('<a class="label label-success" href="%s">%s</a>' % (cpurl, concept.label))
-    return cell
+    return {
+        'latest_version': summarize_version(latest) if latest else None,
+        'history_url': reverse('history_rest_list', args=(typed, obj.id)),
+    }
 
 
-def get_user_or_none(pk):
-    """
-    Retrieve a :class:`.GenecologyUser` by ``pk``, or (quiety) return ``None``.
-    """
-    try:
-        return GenecologyUser.objects.get(pk=pk)
-    except GenecologyUser.DoesNotExist:
-        return None
+def get_post_listing():
+    return Post.objects.filter(published=True).select_related('creator')\
+                                              .prefetch_related('tags')
 
 
-def get_default_context():
-    """
-    Generate context used in most/all views.
-    """
-    return {'form': PostSearchForm}
+def get_note_listing():
+    return Note.objects.select_related('creator').prefetch_related('tags')
 
 
-def get_version_data(available_versions):
+def keyset_feed(request, queryset, serializer_class, view_name):
     """
-    Build template-ready version data for ``obj``, suitable for use with the
-    ``history_modal.html`` template fragment.
+    Render one page of ``queryset`` as JSON, with a link to the next page.
     """
-    return [{
-        'id': version.revision_id,
-        'date_created': version.revision.date_created,
-        'user': get_user_or_none(version.revision.user_id),
-        'comment': version.revision.comment,
-    } for version in available_versions]
+    items, cursor = keyset_page(queryset, request.GET.get('before'))
+    next_url = None
+    if cursor:
+        next_url = request.build_absolute_uri('%s?before=%s' % (reverse(view_name), cursor))
+    json = JSONRenderer().render({
+        'results': serializer_class(items, many=True).data,
+        'next': next_url,
+    })
+    return HttpResponse(json, content_type='application/json')
 
 
 ## Views start here.
 
 
+@cache_public_page(depends_on=(Post, Tag, Image, GenecologyUser), timeout=60)
 def home(request):
     """
     The root page of the site. Displays recent blog posts.
     """
+    posts, next_cursor = keyset_page(get_post_listing())
     context = get_default_context()
     context.update({
-        'posts': Post.objects.filter(published=True).order_by('-created'),
-        'tags': Tag.objects.all(),
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'tags': Tag.objects.with_counts(),
         'active': 'home',
-        'image': Image.objects.order_by('?').filter(feature=True).first()
+        'image': random_featured_image(),
     })
     return render(request, 'home.html', context)
 
 
+@cache_public_page(depends_on=(Post, Tag, GenecologyUser))
 def blog(request):
+    posts, next_cursor = keyset_page(get_post_listing(), request.GET.get('before'))
     context = get_default_context()
     context.update({
-        'posts': Post.objects.filter(published=True).order_by('-created'),
-        'tags': Tag.objects.all(),
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'tags': Tag.objects.with_counts(),
         'active': 'blog',
     })
     return render(request, 'blog.html', context)
 
 
+def blog_rest_feed(request):
+    queryset = get_post_listing().prefetch_related('about__typed')
+    return keyset_feed(request, queryset, PostListSerializer, 'blog_rest_feed')
+
+
+@cache_public_page(depends_on=(Note, Tag, GenecologyUser))
 def notes(request):
+    notes, next_cursor = keyset_page(get_note_listing(), request.GET.get('before'))
     context = get_default_context()
     context.update({
-        'notes': Note.objects.all().order_by('-created'),
-        'tags': Tag.objects.all(),
+        'notes': notes,
+        'next_cursor': next_cursor,
+        'tags': Tag.objects.with_counts(),
         'active': 'notes',
     })
     return render(request, 'notes.html', context)
 
 
+def notes_rest_feed(request):
+    return keyset_feed(request, get_note_listing(), NoteListSerializer, 'notes_rest_feed')
+
+
+@cache_public_page(depends_on=(Tag, Post, Note))
 def topics(request):
     context = get_default_context()
     context.update({
-        'tags': Tag.objects.all(),
+        'tags': Tag.objects.with_counts(recent=5),
         'active': 'topics',
     })
     return render(request, 'tags.html', context)
 
 
+def get_int_param(request, name, default):
+    try:
+        return max(int(request.GET.get(name, default)), 0)
+    except ValueError:
+        return default
+
+
 def datum(request, data_id):
+    """
+    Display one page of the rows in a :class:`.Data` CSV file.
+    """
     data_object = get_object_or_404(Data, pk=data_id)
-    response = urllib.urlopen(data_object.location)
-    reader = csv.reader(response)
+    dataset = Dataset(data_object)
 
-    content = [[detect_uri(cell) for cell in row] for row in reader]
+    page = max(get_int_param(request, 'page', 1), 1)
+    offset = (page - 1) * ROWS_PER_PAGE
+    # Header and rows together, so that URIs are resolved in one batch.
+    rows = link_rows(itertools.chain([dataset.header],
+                                     dataset.rows(offset, ROWS_PER_PAGE)))
 
     context = get_default_context()
     context.update({
-        'column_headers': content[0],
-        'data': enumerate(content[1:]),
+        'column_headers': rows[0],
+        'data': enumerate(rows[1:], offset),
         'data_object': data_object,
+        'row_count': dataset.count,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if offset + ROWS_PER_PAGE < dataset.count else None,
+        'next_offset': offset + ROWS_PER_PAGE,
+        'rows_url': reverse('datum_rows', args=(data_object.id,)),
     })
     return render(request, 'csv.html', context)
 
 
+def datum_rows(request, data_id):
+    """
+    Stream rows from a :class:`.Data` CSV file as JSON, starting at row
+    ``offset`` (not counting the header). At most ``limit`` rows are returned.
+    """
+    data_object = get_object_or_404(Data, pk=data_id)
+    dataset = Dataset(data_object)
+
+    offset = get_int_param(request, 'offset', 0)
+    limit = min(get_int_param(request, 'limit', ROWS_PER_PAGE), MAX_ROWS)
+
+    def generate():
+        yield '{"header": %s, "count": %i, "offset": %i, "rows": [' % \
+            (jsonlib.dumps(dataset.header), dataset.count, offset)
+        for i, row in enumerate(dataset.rows(offset, limit)):
+            yield (', ' if i else '') + jsonlib.dumps(row)
+        yield ']}'
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+@cache_public_page(Post, 'post_id', depends_on=RELATED_CONTENT + (Tag, GenecologyUser))
 def post(request, post_id):
     """
     Display the content of a :class:`.Post`\.
     """
     post = get_object_or_404(Post, pk=post_id)
-    available_versions = reversion.get_for_object(post)
-    versions = get_version_data(available_versions)
+    relations_to = ContentRelation.objects.to_objects(post).with_related()
+    relations_from = ContentRelation.objects.from_objects(post).with_related()
+
+    latest = get_latest_version(post)
+    history = get_history_context(post, 'post', latest)
 
-    date, body, subtitle = available_versions[0].revision.date_created, post.body, None
+    date = latest.revision.date_created if latest else post.created
+    body, subtitle = post.body, None
     version_id = request.GET.get('version', None)
 
-    if version_id and int(version_id) != available_versions[0].revision_id:
-        version = available_versions.get(revision_id=version_id)
+    if latest and version_id and int(version_id) != latest.revision_id:
+        version = get_version(post, version_id)
         post = version.object_version.object
         date = version.revision.date_created
         subtitle = 'Historical version %s' % version_id
-        body = mark_safe(generate_patch_html(version, available_versions[0], 'body'))
+        body = get_patch_html(version, latest, 'body')
 
     if not (request.user.is_staff or post.published):
         return HttpResponseNotFound("<h1>Post not found.</h1>")
@@ -185,14 +243,18 @@ def post(request, post_id):
         'subtitle': subtitle,
         'date': date,
         'active': 'blog',
-        'versions': versions,
         'type': 'post',
         'title': post.title,
         'body': body,
+        'relations_to': relations_to,
+        'relations_from': relations_from,
+        'related_version': page_version(Post, post.id, RELATED_CONTENT),
     })
+    context.update(history)
     return render(request, 'post.html', context)
 
 
+@cache_public_page(Note, 'note_id', depends_on=RELATED_CONTENT + (Tag, GenecologyUser))
 def note(request, note_id):
     """
     Display the content of a :class:`.Post`\.
@@ -200,31 +262,30 @@ def note(request, note_id):
 
 
     note = get_object_or_404(Note, pk=note_id)
+    relations_to = list(ContentRelation.objects.to_objects(note).with_related())
+    relations_from = list(ContentRelation.objects.from_objects(note).with_related())
 
-    about_relations = note.relations_from.filter(instance_of__identifier='P129_is_about')
     source_url = None
-    if about_relations.count() > 0:
-        for relation in about_relations:
+    for relation in relations_from:
+        if relation.instance_of and relation.instance_of.identifier == 'P129_is_about':
             if hasattr(relation.target, 'resource_type') and relation.target.resource_type == ExternalResource.WEBSITE:
                 source_url = relation.target.source_location
 
-    available_versions = reversion.get_for_object(note)
-    versions = get_version_data(available_versions)
+    latest = get_latest_version(note)
+    history = get_history_context(note, 'note', latest)
 
-    if len(available_versions) > 0:
-        date, body, subtitle = available_versions[0].revision.date_created, note.content, None
-    else:
-        date, body, subtitle = note.created, note.content, None
+    date = latest.revision.date_created if latest else note.created
+    body, subtitle = note.content, None
     if body.raw.startswith('<?xml'):
         body = body.raw
     version_id = request.GET.get('version', None)
 
-    if version_id and int(version_id) != available_versions[0].revision_id:
-        version = available_versions.get(revision_id=version_id)
+    if latest and version_id and int(version_id) != latest.revision_id:
+        version = get_version(note, version_id)
         note = version.object_version.object
         date = version.revision.date_created
         subtitle = 'Historical version %s' % version_id
-        body = mark_safe(generate_patch_html(version, available_versions[0], 'content'))
+        body = get_patch_html(version, latest, 'content')
 
 
 
@@ -234,12 +295,15 @@ def note(request, note_id):
         'subtitle': subtitle,
         'date': date,
         'active': 'notes',
-        'versions': versions,
         'type': 'note',
         'title': note.title,
         'body': body,
-        'source_url': source_url
+        'source_url': source_url,
+        'relations_to': relations_to,
+        'relations_from': relations_from,
+        'related_version': page_version(Note, note.id, RELATED_CONTENT),
     })
+    context.update(history)
     return render(request, 'note.html', context)
 
 
@@ -250,6 +314,7 @@ def post_rest_detail(request, post_id):
     return HttpResponse(json, content_type='application/json')
 
 
+@cache_public_page(Tag, 'tag_id', depends_on=(Post, GenecologyUser))
 def tag(request, tag_id):
     """
     Displays all of the :class:`.Post`\s associated with a specific
@@ -258,18 +323,19 @@ def tag(request, tag_id):
 
     tag = get_object_or_404(Tag, pk=tag_id)
 
-    available_versions = reversion.get_for_object(tag)
-    versions = get_version_data(available_versions)
+    latest = get_latest_version(tag)
+    history = get_history_context(tag, 'tag', latest)
 
-    date, body, subtitle = available_versions[0].revision.date_created, tag.description, None
+    date = latest.revision.date_created if latest else None
+    body, subtitle = tag.description, None
     version_id = request.GET.get('version', None)
 
-    if version_id and int(version_id) != available_versions[0].revision_id:
-        version = available_versions.get(revision_id=version_id)
+    if latest and version_id and int(version_id) != latest.revision_id:
+        version = get_version(tag, version_id)
         post = version.object_version.object
         date = version.revision.date_created
         subtitle = 'Historical version %s' % version_id
-        body = mark_safe(generate_patch_html(version, available_versions[0], 'description'))
+        body = get_patch_html(version, latest, 'description')
 
     context = get_default_context()
     context.update({
@@ -279,10 +345,10 @@ def tag(request, tag_id):
         'type': 'tag',
         'posts': tag.post_set.filter(published=True).order_by('-created'),
         'active': 'topics',
-        'versions': versions,
         'subtitle': subtitle,
         'body': body,
     })
+    context.update(history)
     return render(request, 'tag.html', context)
 
 
@@ -293,36 +359,75 @@ def tag_rest_detail(request, tag_id):
     return HttpResponse(json, content_type='application/json')
 
 
+# Models whose revision history is exposed by :func:`.history`\.
+HISTORY_MODELS = {
+    'post': Post,
+    'note': Note,
+    'tag': Tag,
+    'conceptprofile': ConceptProfile,
+}
+
+
+def history(request, typed, object_id):
+    """
+    JSON list of revisions of a :class:`.Post`\, :class:`.Note`\,
+    :class:`.Tag` or :class:`.ConceptProfile`\, newest first, paginated with
+    ``page``.
+    """
+    obj = get_object_or_404(HISTORY_MODELS[typed], pk=object_id)
+    if typed == 'post' and not (request.user.is_staff or obj.published):
+        return HttpResponseNotFound("<h1>Post not found.</h1>")
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    versions, has_next = get_history_page(obj, page)
+    json = JSONRenderer().render({
+        'page': page,
+        'has_next': has_next,
+        'results': [{
+            'id': version['id'],
+            'date_created': version['date_created'],
+            'user': unicode(version['user']) if version['user'] else None,
+            'comment': version['comment'],
+        } for version in versions],
+    })
+    return HttpResponse(json, content_type='application/json')
+
+
+@cache_public_page(ConceptProfile, 'profile_id', depends_on=RELATED_CONTENT + (Concept,))
 def conceptprofile(request, profile_id):
     profile = get_object_or_404(ConceptProfile, pk=profile_id)
 
-    available_versions = reversion.get_for_object(profile)
-    versions = get_version_data(available_versions)
+    latest = get_latest_version(profile)
+    history = get_history_context(profile, 'conceptprofile', latest)
     version_id = request.GET.get('version', None)
     body = profile.description
     subtitle = None
 
-    conceptType = ContentType.objects.get_for_model(Concept)
+    # Relations may point at either the profile or its concept.
+    relations_to = ContentRelation.objects.to_objects(profile, profile.concept).with_related()
+    relations_from = ContentRelation.objects.from_objects(profile, profile.concept).with_related()
 
-    relations_to = ContentRelation.objects.filter(target_content_type_id=conceptType.id, target_instance_id=profile.concept.id)
-    relations_from = ContentRelation.objects.filter(source_content_type_id=conceptType.id, source_instance_id=profile.concept.id)
-
-    if version_id and int(version_id) != available_versions[0].revision_id:
-        version = available_versions.get(revision_id=version_id)
+    if latest and version_id and int(version_id) != latest.revision_id:
+        version = get_version(profile, version_id)
         profile = version.object_version.object
         subtitle = 'Historical version %s' % version_id
-        body = mark_safe(generate_patch_html(version, available_versions[0], 'description'))
+        body = get_patch_html(version, latest, 'description')
 
     context = get_default_context()
     context.update({
         'profile': profile,
         'body': body,
         'active': '',
-        'versions': versions,
         'subtitle': subtitle,
         'relations_from': relations_from,
-        'relations_to': relations_to
+        'relations_to': relations_to,
+        'related_version': page_version(ConceptProfile, profile.id, RELATED_CONTENT + (Concept,)),
     })
+    context.update(history)
     return render(request, 'conceptprofile.html', context)
 
 
@@ -339,6 +444,7 @@ def conceptprofiles(request, queryset, typed='', body=''):
     return render(request, 'conceptprofiles.html', context)
 
 
+@cache_public_page(depends_on=(ConceptProfile, Concept))
 def people(request):
     """
     Lists :class:`blog.ConceptProfile`\s for :class:`concepts.Concept`\s with
@@ -355,6 +461,7 @@ def people(request):
     return conceptprofiles(request, queryset, 'people', body)
 
 
+@cache_public_page(depends_on=(ConceptProfile, Concept))
 def institutions(request):
     """
     """
@@ -369,6 +476,7 @@ def institutions(request):
     return conceptprofiles(request, queryset, 'institutions', body)
 
 
+@cache_public_page(depends_on=(ConceptProfile, Concept))
 def organisms(request):
     body = help_text("""
         Use the search interface below to find profiles about organisms
@@ -381,6 +489,7 @@ def organisms(request):
     return conceptprofiles(request, queryset, 'organisms', body)
 
 
+@cache_public_page(depends_on=(ConceptProfile, Concept))
 def places(request):
     body = help_text("""
         Use the search interface below to find profiles about places
@@ -393,6 +502,7 @@ def places(request):
     return conceptprofiles(request, queryset, 'places', body)
 
 
+@cache_public_page()
 def about(request):
     """
     Describes the purpose and content of the site.
@@ -404,6 +514,7 @@ def about(request):
     return render(request, 'about.html', context)
 
 
+@cache_public_page()
 def methods(request):
     """
     Describes the methods that we use in this project.
@@ -415,6 +526,7 @@ def methods(request):
     return render(request, 'methods.html', context)
 
 
+@cache_public_page()
 def contribute(request):
     """
     Describes how researchers can contribute to the project.
@@ -426,6 +538,7 @@ def contribute(request):
     return render(request, 'contribute.html', context)
 
 
+@cache_public_page()
 def team(request):
     """
     Describes who is involved in the project, and how.
@@ -525,6 +638,15 @@ def evernote_preview_note(request, note_id):
     return render(request, 'evernote/preview_note.html', context)
 
 
+@staff_member_required
+def page_cache_stats(request):
+    """
+    Hit and miss counts for the public page cache.
+    """
+    json = JSONRenderer().render(page_cache.stats())
+    return HttpResponse(json, content_type='application/json')
+
+
 def note_content(request, note_id):
     note = get_object_or_404(Note, pk=note_id)
     body = note.content
@@ -25,5 +25,15 @@ class TypeAdmin(admin.ModelAdmin):
 
     list_display = ('label', 'resolved',)
 
+
+class ResolutionJobAdmin(admin.ModelAdmin):
+    model = ResolutionJob
+
+    list_display = ('concept', 'state', 'attempts', 'available',)
+    list_filter = ('state',)
+    raw_id_fields = ('concept',)
+
+
 admin.site.register(Concept, ConceptAdmin)
 admin.site.register(Type, TypeAdmin)
+admin.site.register(ResolutionJob, ResolutionJobAdmin)
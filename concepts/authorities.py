@@ -1,22 +1,157 @@
-from .models import Concept, Type
+from django.conf import settings
+
+from .models import Concept, Type, AuthorityResponse
 
 from conceptpower import Conceptpower
+from requests.adapters import HTTPAdapter
+from functools import wraps
 from urlparse import urlparse
+import requests
+import threading
+import urllib
+import xml.etree.ElementTree as ET
 
 import logging
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 logger.setLevel('DEBUG')
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    A :class:`requests.Session` shared by all authority calls (and threads),
+    so that connections are kept alive and re-used.
+
+    At most ``settings.AUTHORITY_POOL_SIZE`` connections are opened per host;
+    further concurrent requests wait for a free connection.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            size = getattr(settings, 'AUTHORITY_POOL_SIZE', 10)
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size,
+                                  pool_block=True)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def reset_session():
+    """
+    Close pooled connections; the next call to :func:`.get_session` starts
+    afresh (e.g. with new settings).
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+class AuthorityNotFound(LookupError):
+    """
+    The authority has no record of the requested concept or type.
+    """
+
+
+def cached_response(method):
+    """
+    Serve calls to an :class:`.AuthorityManager` method from (and store their
+    results in) the :class:`.AuthorityResponse` cache, keyed on the authority,
+    the method and its arguments. :class:`.AuthorityNotFound` is cached too.
+    """
+    @wraps(method)
+    def wrapper(self, key, *args, **kwargs):
+        arguments = [key] + list(args) + [u'%s=%s' % item for item in sorted(kwargs.items())]
+        cache_key = u'|'.join(arguments)
+
+        response = AuthorityResponse.objects.lookup(self.__name__, method.__name__, cache_key)
+        if response is not None:
+            if not response.found:
+                raise AuthorityNotFound(key)
+            return response.value
+
+        try:
+            data = method(self, key, *args, **kwargs)
+        except AuthorityNotFound:
+            AuthorityResponse.objects.store(self.__name__, method.__name__,
+                                            cache_key, None, found=False)
+            raise
+        AuthorityResponse.objects.store(self.__name__, method.__name__, cache_key, data)
+        return data
+    return wrapper
+
+
 class AuthorityManager(object):
     pass
 
 class ConceptpowerAuthority(AuthorityManager, Conceptpower):
+    """
+    Same interface as :class:`conceptpower.Conceptpower`\, but requests go
+    through the pooled session from :func:`.get_session`\, with timeouts
+    (``settings.AUTHORITY_TIMEOUT``\, as ``(connect, read)`` seconds), and
+    responses are cached (see :func:`.cached_response`\).
+    """
     __name__ = 'ConceptpowerAuthority'
 
-    endpoint = 'http://chps.asu.edu/conceptpower/rest/'
     namespace = '{http://www.digitalhps.org/}'
 
+    def __init__(self, **kwargs):
+        # Conceptpower is not a new-style class, and may not define __init__.
+        #  Either way, it must not get the last word on the endpoint.
+        if hasattr(Conceptpower, '__init__'):
+            Conceptpower.__init__(self, **kwargs)
+        self.endpoint = kwargs.get('endpoint', getattr(
+            settings, 'CONCEPTPOWER_ENDPOINT', 'http://chps.asu.edu/conceptpower/rest/'))
+
+    def _request(self, path, **params):
+        response = get_session().get(self.endpoint + path, params=params,
+                                     timeout=getattr(settings, 'AUTHORITY_TIMEOUT', (3.05, 10)))
+        if response.status_code == 404:
+            raise AuthorityNotFound(params.get('id', path))
+        response.raise_for_status()
+        return ET.fromstring(response.content)
+
+    def _parse(self, entry, related):
+        """
+        Flatten an entry element into a dict. The ``related`` element
+        (``type`` or ``supertype``\) carries its id and URI as attributes.
+        """
+        data = {}
+        for node in entry:
+            data[node.tag.replace(self.namespace, '')] = node.text
+            if node.tag == self.namespace + related:
+                data[related + '_id'] = node.get(related + '_id')
+                data[related + '_uri'] = node.get(related + '_uri')
+        return data
+
+    def _first(self, root, tag, uri):
+        entries = root.findall(self.namespace + tag)
+        if not entries:
+            raise AuthorityNotFound(uri)
+        return entries[0]
+
+    @cached_response
+    def search(self, query, pos='Noun'):
+        path = 'ConceptLookup/%s/%s' % (urllib.quote(query.encode('utf-8')), pos)
+        root = self._request(path)
+        return [self._parse(entry, 'type')
+                for entry in root.findall(self.namespace + 'conceptEntry')]
+
+    @cached_response
+    def get(self, uri):
+        root = self._request('Concept', id=uri)
+        return self._parse(self._first(root, 'conceptEntry', uri), 'type')
+
+    @cached_response
+    def get_type(self, uri):
+        root = self._request('Type', id=uri)
+        return self._parse(self._first(root, 'type_entry', uri), 'supertype')
+
 
 # Register AuthorityManagers here.
 authority_managers = (
@@ -24,9 +159,21 @@ authority_managers = (
     # VogonAuthority,
 )
 
+_managers = {}
+
+
+def get_manager(manager_class):
+    """
+    A shared instance of ``manager_class``\.
+    """
+    if manager_class not in _managers:
+        _managers[manager_class] = manager_class()
+    return _managers[manager_class]
+
+
 def search(query, pos='noun'):
     results = [r for manager in authority_managers
-               for r in manager().search(query, pos=pos)]
+               for r in get_manager(manager).search(query, pos=pos)]
 
 
     concepts = []
@@ -111,7 +258,7 @@ def resolve(sender, instance):
                 if instance.resolved: break # ...until success.
 
 
-                manager = manager_class()
+                manager = get_manager(manager_class)
                 method = getattr(manager, get_method)
                 concept_data = method(instance.uri)
                 concept_data['label'] = concept_data[label_field]
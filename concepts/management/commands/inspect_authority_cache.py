@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from concepts.models import AuthorityResponse
+
+import json
+
+
+class Command(BaseCommand):
+    help = ('Summarize the authority response cache, or show the cached'
+            ' responses for specific URIs or queries.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('keys', nargs='*',
+                            help='URIs (or search queries) to show.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['keys']:
+            for key in options['keys']:
+                for response in AuthorityResponse.objects.filter(key__startswith=key):
+                    state = 'expired' if response.expires <= now else 'fresh'
+                    self.stdout.write('%s [%s, fetched %s]' % (response, state, response.fetched))
+                    self.stdout.write('    %s' % (json.dumps(response.value) if response.found else 'not found'))
+            return
+
+        summary = AuthorityResponse.objects.values('authority', 'method', 'found')\
+                                           .annotate(count=Count('id'))\
+                                           .order_by('authority', 'method', 'found')
+        for row in summary:
+            self.stdout.write('%(authority)s.%(method)s %(found)s: %(count)i' % {
+                'authority': row['authority'],
+                'method': row['method'],
+                'found': 'found' if row['found'] else 'not found',
+                'count': row['count'],
+            })
+        self.stdout.write('Total: %i (%i expired)' % (
+            AuthorityResponse.objects.count(),
+            AuthorityResponse.objects.filter(expires__lte=now).count()))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from concepts.models import AuthorityResponse
+
+
+class Command(BaseCommand):
+    help = 'Delete cached authority responses (by default, all of them).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expired', action='store_true',
+                            help='Only responses that have expired.')
+        parser.add_argument('--not-found', action='store_true', dest='not_found',
+                            help='Only cached misses.')
+        parser.add_argument('--authority', help='Only responses from this authority.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Only the oldest responses in excess of '
+                                 'AUTHORITY_CACHE_MAX_ENTRIES.')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            count = AuthorityResponse.objects.prune()
+            self.stdout.write('Deleted %i responses' % count)
+            return
+
+        queryset = AuthorityResponse.objects.all()
+        if options['expired']:
+            queryset = queryset.filter(expires__lte=timezone.now())
+        if options['not_found']:
+            queryset = queryset.filter(found=False)
+        if options['authority']:
+            queryset = queryset.filter(authority=options['authority'])
+
+        count = queryset.count()
+        queryset.delete()
+        self.stdout.write('Deleted %i responses' % count)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from concepts.models import ResolutionJob
+from concepts.tasks import run_resolution_job
+
+from multiprocessing.pool import ThreadPool
+import time
+
+
+def run(job):
+    try:
+        run_resolution_job(job)
+    finally:
+        connection.close()    # Each thread has its own connection.
+
+
+class Command(BaseCommand):
+    help = 'Resolve queued concepts against their authorities.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=getattr(settings, 'CONCEPT_RESOLUTION_WORKERS', 4),
+                            help='Number of concepts to resolve concurrently.')
+        parser.add_argument('--poll', type=float, default=5,
+                            help='Seconds to wait when no jobs are due.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no jobs are due.')
+        parser.add_argument('--stale', type=int, default=600,
+                            help='Requeue jobs that have been running for this'
+                                 ' many seconds (e.g. because a worker died).')
+
+    def handle(self, *args, **options):
+        pool = ThreadPool(options['workers'])
+        try:
+            while True:
+                ResolutionJob.objects.release_stale(options['stale'])
+                jobs = ResolutionJob.objects.claim(options['workers'] * 2)
+                if jobs:
+                    pool.map(run, jobs)
+                    self.stdout.write('Processed %i jobs' % len(jobs))
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll'])
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,59 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from concepts.authorities import (get_namespace, get_by_namespace, get_manager,
+                                  AuthorityNotFound)
+from concepts.models import Concept, Type
+
+from multiprocessing.pool import ThreadPool
+import requests
+
+
+def fetch(item):
+    """
+    Look up one concept or type; the response is cached as a side effect.
+    """
+    uri, is_type = item
+    try:
+        managers = get_by_namespace(get_namespace(uri))
+        if not managers:
+            return 'skipped'
+        manager = get_manager(managers[0])
+        (manager.get_type if is_type else manager.get)(uri)
+        return 'found'
+    except AuthorityNotFound:
+        return 'not found'
+    except (ValueError, requests.RequestException):
+        return 'failed'
+    finally:
+        connection.close()    # Each thread has its own connection.
+
+
+class Command(BaseCommand):
+    help = ('Cache authority records for stored concepts and types, so that'
+            ' resolving them later needs no remote calls.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of concurrent lookups.')
+        parser.add_argument('--unresolved', action='store_true',
+                            help='Only concepts that have not been resolved.')
+
+    def handle(self, *args, **options):
+        queryset = Concept.objects.exclude(uri=None)
+        if options['unresolved']:
+            queryset = queryset.filter(resolved=False)
+        type_id = ContentType.objects.get_for_model(Type).id
+        items = [(uri, real_type_id == type_id)
+                 for uri, real_type_id in queryset.values_list('uri', 'real_type_id')]
+
+        pool = ThreadPool(options['workers'])
+        try:
+            outcomes = pool.map(fetch, items)
+        finally:
+            pool.close()
+            pool.join()
+
+        for outcome in ('found', 'not found', 'failed', 'skipped'):
+            self.stdout.write('%10s: %i' % (outcome, outcomes.count(outcome)))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResolutionJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('state', models.CharField(default=b'pending', max_length=10, choices=[(b'pending', b'Pending'), (b'running', b'Running'), (b'done', b'Done'), (b'failed', b'Failed')])),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(null=True, blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('available', models.DateTimeField(default=django.utils.timezone.now, help_text=b'Not run before this time.')),
+                ('claimed', models.DateTimeField(null=True, blank=True)),
+                ('concept', models.OneToOneField(related_name='resolution_job', to='concepts.Concept')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='resolutionjob',
+            index_together=set([('state', 'available')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0002_resolutionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorityResponse',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('authority', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=50)),
+                ('key', models.TextField()),
+                ('key_hash', models.CharField(unique=True, max_length=40)),
+                ('found', models.BooleanField(default=True)),
+                ('data', models.TextField(null=True, blank=True)),
+                ('fetched', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
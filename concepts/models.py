@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.core.urlresolvers import reverse
+from django.utils import timezone
+
+import datetime
+import hashlib
+import json
+import random
 
 optional = { 'blank': True, 'null': True }
 
@@ -61,3 +68,205 @@ class Concept(HeritableObject):
 
 class Type(Concept):
     pass
+
+
+class ResolutionJobManager(models.Manager):
+    def enqueue(self, concept):
+        """
+        Queue ``concept`` (a :class:`.Concept` or :class:`.Type`\) to be
+        resolved by the ``resolve_concepts`` worker. A concept has at most one
+        job, so queueing it again while it is pending does nothing.
+        """
+        if concept.resolved or not concept.uri:
+            return None
+        job, created = self.get_or_create(concept_id=concept.pk)
+        if not created and job.state in (ResolutionJob.DONE, ResolutionJob.FAILED):
+            job.state = ResolutionJob.PENDING
+            job.attempts = 0
+            job.available = timezone.now()
+            job.save()
+        return job
+
+    def enqueue_many(self, concepts):
+        """
+        Queue several new :class:`.Concept`\s at once.
+        """
+        existing = set(self.filter(concept__in=concepts)
+                           .values_list('concept_id', flat=True))
+        now = timezone.now()
+        self.bulk_create([
+            ResolutionJob(concept_id=concept.pk, available=now)
+            for concept in concepts
+            if concept.pk not in existing and not concept.resolved
+        ])
+
+    def claim(self, limit):
+        """
+        Mark (up to) ``limit`` jobs that are due as running, and return them.
+
+        A job is claimed only if it is still pending at the moment of the
+        update, so concurrent workers never run the same job.
+        """
+        now = timezone.now()
+        candidates = self.filter(state=ResolutionJob.PENDING, available__lte=now)\
+                         .order_by('available', 'id')\
+                         .values_list('id', flat=True)[:limit]
+        claimed = [pk for pk in candidates
+                   if self.filter(pk=pk, state=ResolutionJob.PENDING)
+                          .update(state=ResolutionJob.RUNNING, claimed=now)]
+        return list(self.filter(pk__in=claimed).select_related('concept'))
+
+    def release_stale(self, timeout):
+        """
+        Return jobs that have been running for more than ``timeout`` seconds
+        (e.g. because their worker died) to the queue.
+        """
+        cutoff = timezone.now() - datetime.timedelta(seconds=timeout)
+        return self.filter(state=ResolutionJob.RUNNING, claimed__lt=cutoff)\
+                   .update(state=ResolutionJob.PENDING)
+
+
+class ResolutionJob(models.Model):
+    """
+    A :class:`.Concept` waiting to be resolved against its authority.
+
+    Resolution involves (potentially slow) calls to remote services, so it
+    happens in the ``resolve_concepts`` worker rather than in the request
+    that saved the concept.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    state_choices = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    concept = models.OneToOneField(Concept, related_name='resolution_job')
+    state = models.CharField(max_length=10, choices=state_choices, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(**optional)
+
+    created = models.DateTimeField(auto_now_add=True)
+    available = models.DateTimeField(default=timezone.now,
+                                     help_text='Not run before this time.')
+    claimed = models.DateTimeField(**optional)
+
+    objects = ResolutionJobManager()
+
+    class Meta:
+        index_together = (('state', 'available'),)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.concept.uri, self.state)
+
+    def succeed(self):
+        self.state = ResolutionJob.DONE
+        self.attempts += 1
+        self.last_error = None
+        self.save()
+
+    def fail(self, error):
+        """
+        Record a failed attempt. The job is retried with exponential backoff,
+        up to ``settings.CONCEPT_RESOLUTION_MAX_ATTEMPTS`` attempts.
+        """
+        self.attempts += 1
+        self.last_error = error
+        max_attempts = getattr(settings, 'CONCEPT_RESOLUTION_MAX_ATTEMPTS', 6)
+        if self.attempts >= max_attempts:
+            self.state = ResolutionJob.FAILED
+        else:
+            base = getattr(settings, 'CONCEPT_RESOLUTION_BACKOFF', 30)
+            delay = base * 2 ** (self.attempts - 1)
+            self.state = ResolutionJob.PENDING
+            self.available = timezone.now() + datetime.timedelta(seconds=delay)
+        self.save()
+
+
+class AuthorityResponseManager(models.Manager):
+    @staticmethod
+    def _hash(authority, method, key):
+        return hashlib.sha1(u'|'.join([authority, method, key]).encode('utf-8')).hexdigest()
+
+    def lookup(self, authority, method, key):
+        """
+        The unexpired :class:`.AuthorityResponse` for ``method`` called with
+        ``key``\, or ``None``\.
+        """
+        return self.filter(key_hash=self._hash(authority, method, key),
+                           expires__gt=timezone.now()).first()
+
+    def store(self, authority, method, key, data, found=True):
+        """
+        Cache the result of a call to an authority. Misses (``found=False``\)
+        are kept for ``settings.AUTHORITY_CACHE_NEGATIVE_TTL`` seconds, hits
+        for ``settings.AUTHORITY_CACHE_TTL``\.
+
+        Pruning counts the whole table, so it only happens after a fraction
+        (``settings.AUTHORITY_CACHE_PRUNE_FREQUENCY``\) of inserts; the table
+        may briefly exceed ``settings.AUTHORITY_CACHE_MAX_ENTRIES``\.
+        """
+        if found:
+            ttl = getattr(settings, 'AUTHORITY_CACHE_TTL', 60 * 60 * 24 * 30)
+        else:
+            ttl = getattr(settings, 'AUTHORITY_CACHE_NEGATIVE_TTL', 60 * 60 * 24)
+        now = timezone.now()
+        response, created = self.update_or_create(
+            key_hash=self._hash(authority, method, key),
+            defaults={
+                'authority': authority,
+                'method': method,
+                'key': key,
+                'found': found,
+                'data': json.dumps(data) if found else None,
+                'fetched': now,
+                'expires': now + datetime.timedelta(seconds=ttl),
+            })
+        frequency = getattr(settings, 'AUTHORITY_CACHE_PRUNE_FREQUENCY', 0.01)
+        if created and random.random() < frequency:
+            self.prune()
+        return response
+
+    def prune(self, max_entries=None):
+        """
+        Delete the oldest responses in excess of ``max_entries`` (by default,
+        ``settings.AUTHORITY_CACHE_MAX_ENTRIES``\).
+        """
+        if max_entries is None:
+            max_entries = getattr(settings, 'AUTHORITY_CACHE_MAX_ENTRIES', 100000)
+        excess = self.count() - max_entries
+        if excess > 0:
+            oldest = list(self.order_by('fetched', 'id').values_list('id', flat=True)[:excess])
+            self.filter(id__in=oldest).delete()
+        return max(excess, 0)
+
+
+class AuthorityResponse(models.Model):
+    """
+    A cached response from an :class:`concepts.authorities.AuthorityManager`
+    method, or a record that the authority had no such concept (``found`` is
+    ``False``\).
+    """
+    authority = models.CharField(max_length=255)
+    method = models.CharField(max_length=50)
+    key = models.TextField()
+    key_hash = models.CharField(max_length=40, unique=True)
+
+    found = models.BooleanField(default=True)
+    data = models.TextField(**optional)
+
+    fetched = models.DateTimeField(default=timezone.now)
+    expires = models.DateTimeField(db_index=True)
+
+    objects = AuthorityResponseManager()
+
+    def __unicode__(self):
+        return u'%s.%s(%s)' % (self.authority, self.method, self.key)
+
+    @property
+    def value(self):
+        return json.loads(self.data) if self.found else None
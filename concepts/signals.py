@@ -1,9 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from concepts.authorities import resolve
-from concepts.models import Concept, Type
-from concepts.tasks import resolve_concept
+from concepts.models import Concept, Type, ResolutionJob
 
 import logging
 logging.basicConfig()
@@ -15,19 +13,21 @@ logger.setLevel('DEBUG')
 @receiver(post_save, sender=Concept)
 def concept_post_save_receiver(sender, **kwargs):
     """
-    When a :class:`.Concept` is saved, attempt to resolve it using one of the
-    registered :class:`.AuthorityManager` classes if the :class:`.Concept` is
-    not already :prop:`.resolved`\.
+    When a :class:`.Concept` is saved, queue it to be resolved using one of
+    the registered :class:`.AuthorityManager` classes if the :class:`.Concept`
+    is not already :prop:`.resolved`\.
     """
-    instance = kwargs.get('instance', None)
-    resolve_concept(sender, instance)
+    if kwargs.get('raw', False):    # Loading fixtures.
+        return
+    ResolutionJob.objects.enqueue(kwargs.get('instance'))
 
 @receiver(post_save, sender=Type)
 def type_post_save_receiver(sender, **kwargs):
     """
-    When a :class:`.Type` is saved, attempt to resolve it using one of the
+    When a :class:`.Type` is saved, queue it to be resolved using one of the
     registered :class:`.AuthorityManager` classes if the :class:`.Type` is
     not already :prop:`.resolved`\.
     """
-    instance = kwargs.get('instance', None)
-    resolve_concept(sender, instance)
+    if kwargs.get('raw', False):    # Loading fixtures.
+        return
+    ResolutionJob.objects.enqueue(kwargs.get('instance'))
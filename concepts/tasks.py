@@ -18,3 +18,17 @@ def search_concept(query, pos='noun'):
         search(query, pos)
     except requests.exceptions.ConnectionError:
         pass
+
+
+def run_resolution_job(job):
+    """
+    Resolve the :class:`.Concept` for a :class:`.ResolutionJob`\, and record
+    the outcome on the job.
+    """
+    try:
+        instance = job.concept.cast()
+        resolve(type(instance), instance)
+    except Exception as error:    # Retried later; see ResolutionJob.fail().
+        job.fail(repr(error))
+    else:
+        job.succeed()
@@ -1,9 +1,109 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db.models.signals import post_save
-from concepts.authorities import resolve, search
-from concepts.models import Concept, Type
+from django.utils import timezone
+from concepts.authorities import (resolve, search, ConceptpowerAuthority,
+                                  reset_session, AuthorityNotFound)
+from concepts.models import Concept, Type, ResolutionJob, AuthorityResponse
+from concepts.tasks import run_resolution_job
+from blog.models import GenecologyUser
 from concepts.signals import concept_post_save_receiver, type_post_save_receiver
 
+from multiprocessing.pool import ThreadPool
+import BaseHTTPServer
+import datetime
+import SocketServer
+import threading
+import urlparse
+
+REPLY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<conceptpowerReply xmlns:digitalHPS="http://www.digitalhps.org/">%s</conceptpowerReply>"""
+
+CONCEPT_XML = """
+    <digitalHPS:conceptEntry>
+        <digitalHPS:id>%(uri)s</digitalHPS:id>
+        <digitalHPS:lemma>%(lemma)s</digitalHPS:lemma>
+        <digitalHPS:pos>noun</digitalHPS:pos>
+        <digitalHPS:description>Stand-in concept</digitalHPS:description>
+        <digitalHPS:conceptList>Test</digitalHPS:conceptList>
+        <digitalHPS:type type_id="T1" type_uri="%(type_uri)s">E21 Person</digitalHPS:type>
+    </digitalHPS:conceptEntry>"""
+
+TYPE_XML = """
+    <digitalHPS:type_entry>
+        <digitalHPS:type_id>T1</digitalHPS:type_id>
+        <digitalHPS:type>E21 Person</digitalHPS:type>
+        <digitalHPS:description>Stand-in type</digitalHPS:description>
+    </digitalHPS:type_entry>"""
+
+TYPE_URI = 'http://www.digitalhps.org/types/TYPE_1'
+
+
+class ConceptpowerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Mimics the Conceptpower REST API, for a fixed set of :attr:`.concepts`\.
+    Keeps connections alive, like the real thing.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    concepts = {
+        'http://www.digitalhps.org/concepts/CON1': 'Anthony David Bradshaw',
+        'http://www.digitalhps.org/concepts/CON2': 'Jens Clausen',
+    }
+    requests = []    # (client port, path)
+
+    def do_GET(self):
+        self.requests.append((self.client_address[1], self.path))
+        url = urlparse.urlparse(self.path)
+        uri = urlparse.parse_qs(url.query).get('id', [None])[0]
+
+        if url.path.endswith('/Concept') and uri in self.concepts:
+            body = REPLY_XML % self.entry(uri)
+        elif url.path.endswith('/Type') and uri == TYPE_URI:
+            body = REPLY_XML % TYPE_XML
+        elif '/ConceptLookup/' in url.path:
+            query = urlparse.unquote(url.path.split('/')[-2])
+            body = REPLY_XML % ''.join([self.entry(uri) for uri, lemma
+                                        in sorted(self.concepts.items())
+                                        if query in lemma])
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def entry(self, uri):
+        return CONCEPT_XML % {'uri': uri, 'lemma': self.concepts[uri],
+                              'type_uri': TYPE_URI}
+
+    def log_message(self, *args):
+        pass
+
+
+class ConceptpowerStandIn(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), ConceptpowerHandler)
+        self.endpoint = 'http://127.0.0.1:%i/rest/' % self.server_port
+
+    def start(self):
+        ConceptpowerHandler.requests = []
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
 
 def disconnect_signal(signal, receiver, sender):
     disconnect = getattr(signal, 'disconnect')
@@ -42,3 +142,139 @@ class TestConceptResolve(TestCase):
     def tearDown(self):
         reconnect_signal(post_save, concept_post_save_receiver, Concept)
         reconnect_signal(post_save, type_post_save_receiver, Type)
+
+
+class TestResolutionQueue(TestCase):
+    def setUp(self):
+        # blog.signals creates an Entity (an E1_CRM_Entity, which migrations
+        #  load) and a ConceptProfile for each Concept.
+        GenecologyUser.objects.create_user('test', 'test@example.com')
+
+        # No registered authority, so resolution is a no-op.
+        self.concept = Concept.objects.create(uri='http://example.com/concept/1',
+                                              authority='Test')
+
+    def test_enqueued_on_save(self):
+        job = self.concept.resolution_job
+        self.assertEqual(job.state, ResolutionJob.PENDING)
+        self.concept.save()
+        self.assertEqual(ResolutionJob.objects.count(), 1)
+
+    def test_claim(self):
+        jobs = ResolutionJob.objects.claim(10)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].state, ResolutionJob.RUNNING)
+        self.assertEqual(ResolutionJob.objects.claim(10), [])
+
+        run_resolution_job(jobs[0])
+        self.assertEqual(ResolutionJob.objects.get().state, ResolutionJob.DONE)
+
+    @override_settings(CONCEPT_RESOLUTION_MAX_ATTEMPTS=2)
+    def test_backoff(self):
+        job = ResolutionJob.objects.claim(1)[0]
+        job.fail('Timeout')
+        self.assertEqual(job.state, ResolutionJob.PENDING)
+        self.assertEqual(ResolutionJob.objects.claim(1), [])    # Not yet due.
+
+        job.fail('Timeout')
+        self.assertEqual(job.state, ResolutionJob.FAILED)
+        ResolutionJob.objects.enqueue(self.concept)
+        self.assertEqual(len(ResolutionJob.objects.claim(1)), 1)
+
+
+class TestConceptpowerClient(TestCase):
+    def setUp(self):
+        reset_session()
+        self.server = ConceptpowerStandIn()
+        self.server.start()
+        self.authority = ConceptpowerAuthority(endpoint=self.server.endpoint)
+
+    def tearDown(self):
+        reset_session()
+        self.server.stop()
+
+    def test_get(self):
+        data = self.authority.get('http://www.digitalhps.org/concepts/CON1')
+        self.assertEqual(data['lemma'], 'Anthony David Bradshaw')
+        self.assertEqual(data['type_uri'], TYPE_URI)
+        self.assertEqual(self.authority.get_type(TYPE_URI)['type'], 'E21 Person')
+
+    def test_search(self):
+        results = self.authority.search('Clausen')
+        self.assertEqual([r['lemma'] for r in results], ['Jens Clausen'])
+
+    def test_configured_endpoint(self):
+        with override_settings(CONCEPTPOWER_ENDPOINT=self.server.endpoint):
+            authority = ConceptpowerAuthority()
+        self.assertEqual(authority.endpoint, self.server.endpoint)
+        ConceptpowerHandler.requests = []
+        authority._request('Concept', id='http://www.digitalhps.org/concepts/CON1')
+        self.assertEqual(len(ConceptpowerHandler.requests), 1)
+
+    def _get_uncached(self, uri):
+        return self.authority._request('Concept', id=uri)
+
+    def test_keep_alive(self):
+        for i in xrange(10):
+            self._get_uncached('http://www.digitalhps.org/concepts/CON1')
+        ports = set(port for port, path in ConceptpowerHandler.requests)
+        self.assertEqual(len(ports), 1)
+
+    @override_settings(AUTHORITY_POOL_SIZE=2)
+    def test_pool_size(self):
+        reset_session()
+        uris = ['http://www.digitalhps.org/concepts/CON%i' % (i % 2 + 1)
+                for i in xrange(40)]
+        pool = ThreadPool(8)
+        results = pool.map(self._get_uncached, uris)
+        pool.close()
+        self.assertEqual(len(results), 40)
+        ports = set(port for port, path in ConceptpowerHandler.requests)
+        self.assertLessEqual(len(ports), 2)
+
+
+class TestAuthorityCache(TestCase):
+    uri = 'http://www.digitalhps.org/concepts/CON1'
+
+    def setUp(self):
+        self.server = ConceptpowerStandIn()
+        self.server.start()
+        self.authority = ConceptpowerAuthority(endpoint=self.server.endpoint)
+
+    def tearDown(self):
+        reset_session()
+        self.server.stop()
+
+    def test_hit(self):
+        first = self.authority.get(self.uri)
+        self.assertEqual(self.authority.get(self.uri), first)
+        self.assertEqual(len(ConceptpowerHandler.requests), 1)
+
+    def test_not_found(self):
+        for i in xrange(2):
+            with self.assertRaises(AuthorityNotFound):
+                self.authority.get('http://www.digitalhps.org/concepts/CON404')
+        self.assertEqual(len(ConceptpowerHandler.requests), 1)
+
+    def test_expired(self):
+        self.authority.get(self.uri)
+        AuthorityResponse.objects.update(expires=timezone.now() - datetime.timedelta(seconds=1))
+        self.authority.get(self.uri)
+        self.assertEqual(len(ConceptpowerHandler.requests), 2)
+        self.assertEqual(AuthorityResponse.objects.count(), 1)
+
+    @override_settings(AUTHORITY_CACHE_MAX_ENTRIES=3, AUTHORITY_CACHE_PRUNE_FREQUENCY=1)
+    def test_bounded(self):
+        for i in xrange(5):
+            AuthorityResponse.objects.store('Test', 'get', 'uri %i' % i, {})
+        keys = AuthorityResponse.objects.values_list('key', flat=True)
+        self.assertEqual(sorted(keys), ['uri 2', 'uri 3', 'uri 4'])
+
+    @override_settings(AUTHORITY_CACHE_MAX_ENTRIES=3, AUTHORITY_CACHE_PRUNE_FREQUENCY=0)
+    def test_pruned_later(self):
+        with CaptureQueriesContext(connection) as queries:
+            for i in xrange(5):
+                AuthorityResponse.objects.store('Test', 'get', 'uri %i' % i, {})
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        self.assertEqual(AuthorityResponse.objects.prune(), 2)
+        self.assertEqual(AuthorityResponse.objects.count(), 3)
@@ -91,6 +91,38 @@ DATABASES = {
     'default': dj_database_url.config(),
 }
 
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+#
+# Cached pages are invalidated by bumping version keys in the cache, so every
+#  worker and dyno must share it: a process-local cache would only see its
+#  own bumps. Use memcached where available, and otherwise the database (the
+#  table is created by ``manage.py createcachetable``; see the Procfile).
+
+if os.environ.get('MEMCACHE_SERVERS'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['MEMCACHE_SERVERS'].split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'genecology_cache',
+        }
+    }
+
+
+# Parsed copies of RDF vocabularies, used by blog.schema.load_schema.
+SCHEMA_CACHE_DIR = os.path.join(BASE_DIR, 'schema_cache')
+
+# Local copies of remote CSV files, used by blog.datasets.
+DATA_CACHE_DIR = os.path.join(BASE_DIR, 'data_cache')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
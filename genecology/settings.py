@@ -94,6 +94,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Parsed copies of RDF vocabularies, used by blog.schema.load_schema.
+SCHEMA_CACHE_DIR = os.path.join(BASE_DIR, 'schema_cache')
+
+# Local copies of remote CSV files, used by blog.datasets.
+DATA_CACHE_DIR = os.path.join(BASE_DIR, 'data_cache')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
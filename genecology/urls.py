@@ -31,7 +31,9 @@ urlpatterns = [
     url(r'^$', blog_views.home, name='home'),
     url(r'^about/$', blog_views.about, name='about'),
     url(r'^blog/$', blog_views.blog, name='blog'),
+    url(r'^blog[/]?.json$', blog_views.blog_rest_feed, name='blog_rest_feed'),
     url(r'^notes/$', blog_views.notes, name='notes'),
+    url(r'^notes[/]?.json$', blog_views.notes_rest_feed, name='notes_rest_feed'),
     url(r'^topic/$', blog_views.topics, name='topics'),
     url(r'^contribute/$', blog_views.contribute, name='contribute'),
     url(r'^methods/$', blog_views.methods, name='methods'),
@@ -51,10 +53,13 @@ urlpatterns = [
     url(r'^note/(?P<note_id>[0-9]+)/$', blog_views.note, name='note'),
     url(r'^note/(?P<note_id>[0-9]+)/content/$', blog_views.note_content, name='note-content'),
     url(r'^data/(?P<data_id>[0-9]+)/$', blog_views.datum, name='datum'),
+    url(r'^data/(?P<data_id>[0-9]+)/rows[/]?.json$', blog_views.datum_rows, name='datum_rows'),
     url(r'^post/(?P<post_id>[0-9]+)[/]?.json$', blog_views.post_rest_detail, name='post_rest_detail'),
     url(r'^topic/(?P<tag_id>[0-9]+)/$', blog_views.tag, name='tag'),
     url(r'^topic/(?P<tag_id>[0-9]+)[/]?.json$', blog_views.tag_rest_detail, name='tag_rest_detail'),
+    url(r'^history/(?P<typed>post|note|tag|conceptprofile)/(?P<object_id>[0-9]+)[/]?.json$', blog_views.history, name='history_rest_list'),
     url(r'^search/', blog_views.PostSearchView.as_view(), name='search'),
+    url(r'^admin/page-cache/$', blog_views.page_cache_stats, name='page_cache_stats'),
     url(r'^admin/', admin.site.urls),
     url(r'^grappelli/', include('grappelli.urls')),
     url(r'^evernote/note/(?P<note_id>[a-zA-Z0-9\-]+)$', blog_views.evernote_preview_note, name='evernote-preview-note'),